@@ -15,28 +15,67 @@ import os
 import requests
 import zipfile
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Zenodo download URL
 DATASET_URL = "https://zenodo.org/records/11492215/files/muharaf-public.zip?download=1"
 OUTPUT_DIR = "training_data_lines/muharaf"
 ZIP_FILE = "training_data_lines/muharaf/muharaf-public.zip"
 
+# Re-encode JPG line images as PNG so training globs on "*.png" pick them up.
+# Set to False to hardlink the original .jpg instead (Kraken reads JPEG too).
+CONVERT_JPG_TO_PNG = True
+
+# Shared session: keeps the TLS connection alive across retries/resumes
+SESSION = requests.Session()
+SESSION.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+))
+
 
 def download_file(url, dest_path, chunk_size=8192):
-    """Download a file with progress indicator."""
+    """
+    Download a file with progress indicator.
+
+    Data is written to ``<dest_path>.part`` and renamed once complete, so an
+    interrupted download is resumed with a Range request on the next run.
+    """
     print(f"Downloading: {dest_path}")
     print(f"URL: {url}")
 
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+    part_path = str(dest_path) + ".part"
+    existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={existing}-"} if existing else {}
 
     try:
-        response = requests.get(url, headers=headers, stream=True, timeout=120)
+        response = SESSION.get(url, headers=headers, stream=True, timeout=120)
+
+        if response.status_code == 416:
+            # Range not satisfiable: the partial file is already complete
+            os.replace(part_path, dest_path)
+            print(f"  Downloaded: {dest_path}")
+            return True
+
         response.raise_for_status()
 
+        if response.status_code == 206:
+            print(f"  Resuming from {existing / 1024 / 1024:.1f} MB")
+            mode = 'ab'
+        else:
+            # Server ignored the Range header, start over
+            existing = 0
+            mode = 'wb'
+
         total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
+        if total_size > 0:
+            total_size += existing
+        downloaded = existing
 
-        with open(dest_path, 'wb') as f:
+        with open(part_path, mode) as f:
             for chunk in response.iter_content(chunk_size=chunk_size):
                 f.write(chunk)
                 downloaded += len(chunk)
@@ -46,6 +85,7 @@ def download_file(url, dest_path, chunk_size=8192):
                     mb_total = total_size / 1024 / 1024
                     print(f"\r  Progress: {pct:.1f}% ({mb_down:.1f}/{mb_total:.1f} MB)", end="", flush=True)
 
+        os.replace(part_path, dest_path)
         print(f"\n  Downloaded: {dest_path}")
         return True
 
@@ -128,14 +168,20 @@ def prepare_kraken_format():
 
         if gt_file:
             out_name = f"muharaf_{total_pairs:05d}"
-            out_png = output_lines_dir / f"{out_name}.png"
             out_gt = output_lines_dir / f"{out_name}.gt.txt"
 
             try:
-                # Convert JPG to PNG for consistency
-                from PIL import Image
-                img = Image.open(jpg_file)
-                img.save(out_png)
+                if CONVERT_JPG_TO_PNG:
+                    # Convert JPG to PNG for consistency (fast, lossless setting)
+                    from PIL import Image
+                    img = Image.open(jpg_file)
+                    img.save(output_lines_dir / f"{out_name}.png", compress_level=1)
+                else:
+                    out_jpg = output_lines_dir / f"{out_name}.jpg"
+                    try:
+                        os.link(jpg_file, out_jpg)
+                    except OSError:
+                        shutil.copy2(jpg_file, out_jpg)
                 shutil.copy2(gt_file, out_gt)
                 total_pairs += 1
             except Exception as e:
@@ -10,6 +10,7 @@ Contains:
 - Already in Kraken format (.png + .gt.txt pairs)
 """
 
+import json
 import os
 import shutil
 import subprocess
@@ -21,6 +22,10 @@ REPO_URL = "https://github.com/OpenITI/OCR_GS_Data.git"
 CLONE_DIR = "training_data_lines/openiti_raw"
 OUTPUT_DIR = "training_data_lines/openiti_gs_lines"
 
+# Source (size, mtime) of each collected pair by output name (makes re-runs
+# skip finished copies)
+COLLECT_INDEX = os.path.join(OUTPUT_DIR, ".collected_index.json")
+
 # Languages to include (subdirectories in the repo)
 LANGUAGES = ["ara", "fas"]  # Arabic and Persian
 
@@ -36,11 +41,30 @@ def clone_repo():
     print()
 
     try:
+        # Partial + sparse clone: only fetch blobs for the languages we use
         result = subprocess.run(
-            ["git", "clone", "--depth", "1", REPO_URL, CLONE_DIR],
+            ["git", "clone", "--depth", "1", "--filter=blob:none", "--sparse",
+             REPO_URL, CLONE_DIR],
             capture_output=True,
             text=True
         )
+        if result.returncode == 0:
+            result = subprocess.run(
+                ["git", "-C", CLONE_DIR, "sparse-checkout", "set"] + LANGUAGES,
+                capture_output=True,
+                text=True
+            )
+
+        if result.returncode != 0:
+            # Older Git without partial clone support: fall back to a full clone
+            print(f"Sparse clone failed, retrying full clone: {result.stderr.strip()}")
+            shutil.rmtree(CLONE_DIR, ignore_errors=True)
+            result = subprocess.run(
+                ["git", "clone", "--depth", "1", REPO_URL, CLONE_DIR],
+                capture_output=True,
+                text=True
+            )
+
         if result.returncode != 0:
             print(f"Git clone failed: {result.stderr}")
             return False
@@ -55,10 +79,73 @@ def clone_repo():
         return False
 
 
+def iter_line_pairs(top_dir):
+    """
+    Yield (dir, base_name, png_path, gt_path) for every .png/.gt.txt pair.
+
+    Walks with os.scandir and pairs files from the directory listing itself,
+    so no extra stat call is needed to check that the .gt.txt exists.
+    """
+    stack = [top_dir]
+    while stack:
+        current = stack.pop()
+        files = {}
+        with os.scandir(current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    files[entry.name] = entry.path
+
+        for name, path in files.items():
+            if not name.endswith('.png'):
+                continue
+            base_name = name[:-4]  # Remove .png
+            gt_path = files.get(base_name + '.gt.txt')
+            if gt_path:
+                yield current, base_name, path, gt_path
+
+
+def load_collect_index():
+    """Load {output name: source stamp} for the pairs collected by previous runs."""
+    try:
+        with open(COLLECT_INDEX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_collect_index(index):
+    """Persist the source stamps of the pairs collected so far."""
+    with open(COLLECT_INDEX, 'w', encoding='utf-8') as f:
+        json.dump(index, f, sort_keys=True)
+
+
+def pair_stamp(png_path, gt_path):
+    """Size and mtime of both files of a pair; changes when either is edited."""
+    png_stat = os.stat(png_path)
+    gt_stat = os.stat(gt_path)
+    return [png_stat.st_size, png_stat.st_mtime_ns, gt_stat.st_size, gt_stat.st_mtime_ns]
+
+
 def collect_training_pairs():
     """Collect all .png/.gt.txt pairs from the cloned repository."""
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+    index = load_collect_index()
+    try:
+        return _collect_training_pairs(index)
+    finally:
+        save_collect_index(index)
+
+
+def _collect_training_pairs(index):
+    """
+    Copy every pair not already collected unchanged, recording it in index.
+
+    A pair is skipped only if index has the same source stamp for its
+    output name and both output files still exist.
+    """
     total_pairs = 0
 
     for lang in LANGUAGES:
@@ -69,37 +156,38 @@ def collect_training_pairs():
 
         print(f"\nProcessing {lang} data...")
         lang_pairs = 0
-
-        # Walk through all subdirectories
-        for root, dirs, files in os.walk(lang_dir):
-            png_files = [f for f in files if f.endswith('.png')]
-
-            for png_file in png_files:
-                # Check for corresponding .gt.txt file
-                base_name = png_file[:-4]  # Remove .png
-                gt_file = base_name + '.gt.txt'
-
-                png_path = os.path.join(root, png_file)
-                gt_path = os.path.join(root, gt_file)
-
-                if os.path.exists(gt_path):
-                    # Create unique output name
-                    rel_path = os.path.relpath(root, lang_dir)
-                    safe_name = rel_path.replace(os.sep, '_').replace(' ', '_')
-                    out_name = f"openiti_{lang}_{safe_name}_{base_name}"
-
-                    # Copy files to output directory
-                    out_png = os.path.join(OUTPUT_DIR, out_name + '.png')
-                    out_gt = os.path.join(OUTPUT_DIR, out_name + '.gt.txt')
-
-                    try:
-                        shutil.copy2(png_path, out_png)
-                        shutil.copy2(gt_path, out_gt)
-                        lang_pairs += 1
-                    except Exception as e:
-                        print(f"  Error copying {png_file}: {e}")
+        skipped = 0
+
+        for root, base_name, png_path, gt_path in iter_line_pairs(lang_dir):
+            # Create unique output name
+            rel_path = os.path.relpath(root, lang_dir)
+            safe_name = rel_path.replace(os.sep, '_').replace(' ', '_')
+            out_name = f"openiti_{lang}_{safe_name}_{base_name}"
+
+            out_png = os.path.join(OUTPUT_DIR, out_name + '.png')
+            out_gt = os.path.join(OUTPUT_DIR, out_name + '.gt.txt')
+
+            try:
+                stamp = pair_stamp(png_path, gt_path)
+
+                # Skip pairs already copied by a previous run (and not
+                # deleted from the output since)
+                if (index.get(out_name) == stamp and os.path.exists(out_png)
+                        and os.path.exists(out_gt)):
+                    skipped += 1
+                    continue
+
+                # Copy files to output directory
+                shutil.copy2(png_path, out_png)
+                shutil.copy2(gt_path, out_gt)
+                index[out_name] = stamp
+                lang_pairs += 1
+            except Exception as e:
+                print(f"  Error copying {base_name}.png: {e}")
 
         print(f"  Found {lang_pairs} line pairs for {lang}")
+        if skipped:
+            print(f"  Skipped {skipped} pairs already collected")
         total_pairs += lang_pairs
 
     return total_pairs
@@ -80,21 +80,12 @@ def parse_alto_xml(xml_path):
         tree = ET.parse(xml_path)
         root = tree.getroot()
 
-        # ALTO namespace
-        ns = {'alto': 'http://www.loc.gov/standards/alto/ns-v3#'}
+        # ALTO namespace (any version, or none), taken from the root tag
+        prefix = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+        textline_tag = prefix + 'TextLine'
+        string_tag = prefix + 'String'
 
-        # Try with namespace first
-        textlines = root.findall('.//alto:TextLine', ns)
-
-        # If not found, try without namespace
-        if not textlines:
-            # Remove namespace from all elements
-            for elem in root.iter():
-                if '}' in elem.tag:
-                    elem.tag = elem.tag.split('}')[1]
-            textlines = root.findall('.//TextLine')
-
-        for textline in textlines:
+        for textline in root.iter(textline_tag):
             # Get coordinates
             hpos = textline.get('HPOS')
             vpos = textline.get('VPOS')
@@ -106,7 +97,7 @@ def parse_alto_xml(xml_path):
 
             # Get text content from String elements
             text_parts = []
-            for string in textline.findall('.//String', ns) or textline.findall('.//String'):
+            for string in textline.iter(string_tag):
                 content = string.get('CONTENT', '')
                 if content:
                     text_parts.append(content)
@@ -243,16 +234,13 @@ def main():
                     x2 = min(img.width, x + w + padding)
                     y2 = min(img.height, y + h + padding)
 
-                    if x2 <= x1 or y2 <= y1:
+                    # Skip very small images (decided from the bbox, before cropping)
+                    if x2 - x1 < 50 or y2 - y1 < 15:
                         continue
 
                     try:
                         line_img = img.crop((x1, y1, x2, y2))
 
-                        # Skip very small images
-                        if line_img.width < 50 or line_img.height < 15:
-                            continue
-
                         # Save
                         out_png = OUTPUT_DIR / f"openiti_{total_lines:05d}.png"
                         out_gt = OUTPUT_DIR / f"openiti_{total_lines:05d}.gt.txt"
@@ -6,6 +6,8 @@ Sources:
 - Hazm stopwords
 """
 
+import heapq
+import tempfile
 import urllib.request
 import os
 from pathlib import Path
@@ -37,6 +39,55 @@ def download_file(url, dest_path):
         return False
 
 
+def write_sorted_words(src_path, dest_path):
+    """Write the unique 2+ character words of one file to dest_path, sorted."""
+    with open(src_path, 'r', encoding='utf-8', errors='ignore') as f:
+        words = sorted({w for w in (line.strip() for line in f) if len(w) >= 2})
+    with open(dest_path, 'w', encoding='utf-8') as f:
+        for word in words:
+            f.write(word + '\n')
+
+
+def merge_dictionaries(txt_files, combined_path, sample_size=20):
+    """
+    Merge word lists into one sorted, de-duplicated dictionary.
+
+    Each input is sorted into a temporary file on its own, then the runs are
+    streamed through heapq.merge so only one word per file is held at a time.
+    Returns (unique word count, first sample_size words).
+    """
+    total = 0
+    sample = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        runs = []
+        for i, txt_file in enumerate(txt_files):
+            run_path = Path(tmp_dir) / f"{i}.txt"
+            try:
+                write_sorted_words(txt_file, run_path)
+            except OSError:
+                continue
+            runs.append(run_path)
+
+        handles = [open(p, 'r', encoding='utf-8') for p in runs]
+        try:
+            with open(combined_path, 'w', encoding='utf-8') as out:
+                prev = None
+                for line in heapq.merge(*handles):
+                    if line == prev:
+                        continue
+                    out.write(line)
+                    prev = line
+                    total += 1
+                    if len(sample) < sample_size:
+                        sample.append(line.rstrip('\n'))
+        finally:
+            for h in handles:
+                h.close()
+
+    return total, sample
+
+
 def main():
     print("=" * 60)
     print("Downloading Persian Dictionary Files")
@@ -50,31 +101,14 @@ def main():
 
     # Create combined dictionary
     print("\nCreating combined dictionary...")
-    combined = set()
-
-    for txt_file in DICT_DIR.glob("*.txt"):
-        try:
-            with open(txt_file, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    word = line.strip()
-                    # Filter: Persian words, 2+ characters
-                    if word and len(word) >= 2:
-                        combined.add(word)
-        except:
-            pass
-
-    # Save combined
     combined_path = BASE_DIR / "persian_dictionary_ganjoor.txt"
-    with open(combined_path, 'w', encoding='utf-8') as f:
-        for word in sorted(combined):
-            f.write(word + '\n')
+    total, sample = merge_dictionaries(sorted(DICT_DIR.glob("*.txt")), combined_path)
 
-    print(f"\nCombined dictionary: {len(combined):,} unique words")
+    print(f"\nCombined dictionary: {total:,} unique words")
     print(f"Saved to: {combined_path}")
 
     # Show sample
     print("\nSample words:")
-    sample = list(combined)[:20]
     for w in sample:
         print(f"  {w}")
 
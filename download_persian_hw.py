@@ -29,24 +29,51 @@ def download_file(url, dest):
         print(f"    Error: {e}")
         return False
 
+def explore_hdf5_mat(mat_path):
+    """Explore a v7.3 (HDF5) MAT file without reading the datasets."""
+    try:
+        import h5py
+    except ImportError:
+        print("  v7.3 MAT file - install h5py to explore it: pip install h5py")
+        return None
+
+    with h5py.File(mat_path, 'r') as f:
+        keys = [k for k in f.keys() if not k.startswith('#')]
+        print(f"  Keys: {keys}")
+        for key in keys:
+            item = f[key]
+            if isinstance(item, h5py.Dataset):
+                print(f"  {key}: shape={item.shape}, dtype={item.dtype}")
+            else:
+                print(f"  {key}: {type(item)}")
+    return None
+
 def explore_mat_file(mat_path):
-    """Explore contents of a MAT file."""
+    """
+    Explore contents of a MAT file.
+
+    Variable shapes come from the file header (sio.whosmat); only variables
+    small enough to show a sample are actually loaded.
+    """
     print(f"\nExploring: {mat_path.name}")
     try:
-        data = sio.loadmat(mat_path)
-        print(f"  Keys: {[k for k in data.keys() if not k.startswith('__')]}")
+        try:
+            variables = sio.whosmat(mat_path)
+        except NotImplementedError:
+            return explore_hdf5_mat(mat_path)
+
+        print(f"  Keys: {[name for name, _, _ in variables]}")
+
+        small = [name for name, shape, _ in variables if np.prod(shape) < 50]
+        data = sio.loadmat(mat_path, variable_names=small) if small else {}
 
-        for key in data.keys():
-            if key.startswith('__'):
-                continue
-            val = data[key]
+        for name, shape, mat_class in variables:
+            val = data.get(name)
             if isinstance(val, np.ndarray):
-                print(f"  {key}: shape={val.shape}, dtype={val.dtype}")
-                # Show sample if small
-                if val.size < 50:
-                    print(f"    Sample: {val.flatten()[:20]}")
+                print(f"  {name}: shape={val.shape}, dtype={val.dtype}")
+                print(f"    Sample: {val.flatten()[:20]}")
             else:
-                print(f"  {key}: {type(val)}")
+                print(f"  {name}: shape={shape}, class={mat_class}")
         return data
     except Exception as e:
         print(f"  Error: {e}")
@@ -5,22 +5,54 @@ Download RASAM dataset (Maghrebi Arabic manuscripts) and convert to Kraken forma
 - Ground truth in PAGE XML format
 """
 
+import argparse
+import io
+import logging
+import time
 import urllib.request
-import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image
-import io
-import time
+import shutil
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from page_common import parse_page_xml, points_bbox
 
 BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "training_data_lines" / "rasam_lines"
 REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
+# Downloaded page JPEGs are kept here so a re-run skips pages already
+# fetched; safe to delete once the lines are extracted
+TEMP_DIR = BASE_DIR / "training_data_lines" / "rasam_temp"
 
 # GitHub raw URLs
 GITHUB_RAW = "https://raw.githubusercontent.com/calfa-co/rasam-dataset/main"
 
-# PAGE XML namespace
-NS = {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'}
+# Per-page progress is INFO (--verbose); download errors are warnings
+logger = logging.getLogger(__name__)
+
+# Pages are fetched concurrently; the pool size is the politeness limit
+DEFAULT_WORKERS = 16
+
+# Shared session: reuses keep-alive connections to GitHub and the IIIF server
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+
+
+def mount_adapter(pool_size):
+    """Size the session's connection pool to the number of fetch threads."""
+    SESSION.mount("https://", HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=3, backoff_factor=0.5),
+    ))
+
+
+mount_adapter(DEFAULT_WORKERS)
 
 
 def download_file(url, dest):
@@ -29,7 +61,7 @@ def download_file(url, dest):
         urllib.request.urlretrieve(url, dest)
         return True
     except Exception as e:
-        print(f"    Error downloading: {e}")
+        logger.warning(f"    Error downloading: {e}")
         return False
 
 
@@ -39,16 +71,17 @@ def get_image_list():
     print(f"Downloading image list from: {list_url}")
 
     try:
-        with urllib.request.urlopen(list_url) as response:
-            content = response.read().decode('utf-8')
-            lines = content.strip().split('\n')
-            # Skip header
-            images = []
-            for line in lines[1:]:
-                parts = line.strip().split('\t')
-                if len(parts) >= 1:
-                    images.append(parts[0])
-            return images
+        response = SESSION.get(list_url, timeout=60)
+        response.raise_for_status()
+        content = response.content.decode('utf-8')
+        lines = content.strip().split('\n')
+        # Skip header
+        images = []
+        for line in lines[1:]:
+            parts = line.strip().split('\t')
+            if len(parts) >= 1:
+                images.append(parts[0])
+        return images
     except Exception as e:
         print(f"Error: {e}")
         return []
@@ -65,79 +98,92 @@ def download_page_xml(image_id):
 
     for url in possible_paths:
         try:
-            with urllib.request.urlopen(url) as response:
-                return response.read().decode('utf-8')
-        except:
+            response = SESSION.get(url, timeout=60)
+            if response.status_code == 200:
+                return response.content.decode('utf-8')
+        except Exception:
             continue
     return None
 
 
 def download_iiif_image(image_id, width=2000):
-    """Download image from BULAC IIIF server."""
-    url = f"https://bina.bulac.fr/iiif/2/{image_id}/full/{width},/0/default.jpg"
+    """
+    Download image from BULAC IIIF server.
+
+    The JPEG is streamed to TEMP_DIR and opened from disk, so it is never
+    buffered in memory; a cached file that fails to open is removed so the
+    next run downloads it again.
+    """
+    dest = TEMP_DIR / f"{image_id}_{width}.jpg"
+    if not dest.exists():
+        url = f"https://bina.bulac.fr/iiif/2/{image_id}/full/{width},/0/default.jpg"
+        part = dest.with_name(dest.name + '.part')
+        try:
+            with SESSION.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with open(part, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, 65536)
+            part.replace(dest)
+        except Exception as e:
+            logger.warning(f"    Error downloading image: {e}")
+            return None
+
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            return Image.open(io.BytesIO(response.read()))
+        img = Image.open(dest)
+        # Let libjpeg decode straight to grayscale, then decode now so the
+        # file is closed before the page is handed back
+        img.draft('L', img.size)
+        img.load()
+        return img
     except Exception as e:
-        print(f"    Error downloading image: {e}")
+        logger.warning(f"    Error opening image: {e}")
+        dest.unlink(missing_ok=True)
         return None
 
 
-def parse_page_xml(xml_content):
-    """Parse PAGE XML and extract text lines with coordinates."""
-    lines = []
-    try:
-        root = ET.fromstring(xml_content)
-
-        # Try different namespace versions
-        namespaces = [
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'},
-        ]
-
-        for ns in namespaces:
-            for textline in root.findall('.//page:TextLine', ns):
-                coords_elem = textline.find('page:Coords', ns)
-                if coords_elem is None:
-                    continue
-
-                coords_str = coords_elem.get('points', '')
-                if not coords_str:
-                    continue
-
-                # Get text
-                text_elem = textline.find('page:TextEquiv/page:Unicode', ns)
-                if text_elem is None or text_elem.text is None:
-                    continue
-
-                text = text_elem.text.strip()
-                if not text:
-                    continue
-
-                # Parse coordinates to bounding box
-                points = []
-                for point in coords_str.split():
-                    x, y = map(int, point.split(','))
-                    points.append((x, y))
-
-                if points:
-                    xs = [p[0] for p in points]
-                    ys = [p[1] for p in points]
-                    bbox = (min(xs), min(ys), max(xs), max(ys))
-                    lines.append({'bbox': bbox, 'text': text})
-
-            if lines:
-                break
+def fetch_page(image_id, delay=0):
+    """
+    Fetch PAGE XML and, if it has lines, the IIIF image for one page.
 
-    except Exception as e:
-        print(f"    XML parse error: {e}")
+    Returns (xml_found, lines, img) with img already decoded; run from a
+    thread pool so several pages are downloaded at once. delay is an optional
+    per-page pause (seconds).
+    """
+    if delay:
+        time.sleep(delay)
+
+    xml_content = download_page_xml(image_id)
+    if not xml_content:
+        return False, [], None
 
-    return lines
+    lines, _, _ = parse_page_xml(io.BytesIO(xml_content.encode('utf-8')))
+    if not lines:
+        return True, lines, None
+
+    return True, lines, download_iiif_image(image_id)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Download RASAM lines in Kraken format")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Pages fetched in parallel (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only process the first N images (default: all)")
+    parser.add_argument("--sleep", type=float, default=0,
+                        help="Pause in seconds before each page fetch (default: 0)")
+    parser.add_argument("--verbose", action="store_true", help="Show per-page progress")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(message)s")
+
+    if args.workers != DEFAULT_WORKERS:
+        mount_adapter(args.workers)
+
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     REPO_DIR.mkdir(parents=True, exist_ok=True)
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
     print("RASAM Dataset Downloader")
     print("="*50)
@@ -155,69 +201,69 @@ def main():
 
     print(f"Found {len(image_ids)} images")
 
-    # For now, let's try a sample to understand the structure
-    print("\nStep 2: Testing with first 3 images...")
+    selected_ids = image_ids[:args.limit]
+    print(f"\nStep 2: Processing {len(selected_ids)} images...")
 
     total_lines = 0
 
-    for i, image_id in enumerate(image_ids[:3]):
-        print(f"\n[{i+1}] Processing: {image_id}")
-
-        # Download PAGE XML
-        xml_content = download_page_xml(image_id)
-        if xml_content:
-            print(f"    Got PAGE XML")
-            lines = parse_page_xml(xml_content)
-            print(f"    Found {len(lines)} lines")
-
-            if lines:
-                # Download image
-                print(f"    Downloading image from IIIF...")
-                img = download_iiif_image(image_id)
-
-                if img:
-                    # Convert to grayscale
-                    if img.mode != 'L':
-                        img = img.convert('L')
-
-                    # Extract lines
-                    for line_data in lines:
-                        bbox = line_data['bbox']
-                        text = line_data['text']
-
-                        # Add padding
-                        padding = 5
-                        x1 = max(0, bbox[0] - padding)
-                        y1 = max(0, bbox[1] - padding)
-                        x2 = min(img.width, bbox[2] + padding)
-                        y2 = min(img.height, bbox[3] + padding)
-
-                        try:
-                            line_img = img.crop((x1, y1, x2, y2))
-
-                            if line_img.width > 20 and line_img.height > 10:
-                                out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
-                                out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
-
-                                line_img.save(out_png)
-                                out_gt.write_text(text, encoding='utf-8')
-                                total_lines += 1
-                        except:
-                            pass
-
-                    print(f"    Extracted {len(lines)} lines")
-        else:
-            print(f"    No PAGE XML found")
-
-        time.sleep(0.5)  # Be nice to the server
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        # Only a few decoded pages are in flight at a time, so memory stays
+        # bounded; pages are taken in order, so output numbering is deterministic
+        pending = deque()
+        next_idx = 0
+
+        for i, image_id in enumerate(selected_ids):
+            while next_idx < len(selected_ids) and len(pending) < 2 * args.workers:
+                pending.append(executor.submit(fetch_page, selected_ids[next_idx], args.sleep))
+                next_idx += 1
+            xml_found, lines, img = pending.popleft().result()
+
+            logger.info(f"\n[{i+1}] Processing: {image_id}")
+
+            if not xml_found:
+                logger.info(f"    No PAGE XML found")
+                continue
+
+            logger.info(f"    Got PAGE XML")
+            logger.info(f"    Found {len(lines)} lines")
+
+            if img:
+                # Convert to grayscale
+                if img.mode != 'L':
+                    img = img.convert('L')
+
+                # Extract lines
+                for line_data in lines:
+                    bbox = points_bbox(line_data['points'])
+                    text = line_data['text']
+
+                    # Add padding
+                    padding = 5
+                    x1 = max(0, bbox[0] - padding)
+                    y1 = max(0, bbox[1] - padding)
+                    x2 = min(img.width, bbox[2] + padding)
+                    y2 = min(img.height, bbox[3] + padding)
+
+                    try:
+                        line_img = img.crop((x1, y1, x2, y2))
+
+                        if line_img.width > 20 and line_img.height > 10:
+                            out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
+                            out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
+
+                            line_img.save(out_png)
+                            out_gt.write_text(text, encoding='utf-8')
+                            total_lines += 1
+                    except:
+                        pass
+
+                logger.info(f"    Extracted {len(lines)} lines")
 
     print(f"\n{'='*50}")
-    print(f"Test complete! Extracted {total_lines} lines")
+    print(f"Complete! Extracted {total_lines} lines")
     print(f"Output: {OUTPUT_DIR}")
 
-    if total_lines > 0:
-        print(f"\nTo download full dataset, modify the script to process all {len(image_ids)} images.")
-    else:
+    if total_lines == 0:
         print("\nNote: The dataset structure may require cloning the full repo.")
         print("Run: git clone https://github.com/calfa-co/rasam-dataset.git")
 
@@ -3,22 +3,63 @@ Download all RASAM images from BULAC IIIF server.
 Uses multiple threads for faster downloading.
 """
 
-import urllib.request
-import ssl
+import argparse
+import logging
+import os
+import pickle
+import shutil
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 BASE_DIR = Path(__file__).parent
 REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
 IMAGES_DIR = BASE_DIR / "training_data_lines" / "rasam_images"
+MAPPING_CACHE = IMAGES_DIR / "image_mapping.pkl"
 
 IIIF_BASE = "https://bina.bulac.fr/iiif/2"
 
-# Create SSL context that doesn't verify certificates
-SSL_CONTEXT = ssl.create_default_context()
-SSL_CONTEXT.check_hostname = False
-SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+# Download counts are INFO (--verbose); failed images are warnings
+logger = logging.getLogger(__name__)
+
+# Downloads are latency-bound, so use many more threads than CPU cores
+DEFAULT_WORKERS = 32
+
+# Shared session: keep-alive connections are reused by all download threads.
+# Certificates are not verified (the IIIF server's chain is not always valid).
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+SESSION.verify = False
+
+
+def mount_adapter(pool_size):
+    """Size the session's connection pool to the number of download threads."""
+    SESSION.mount("https://", HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=3, backoff_factor=0.5),
+    ))
+
+
+mount_adapter(DEFAULT_WORKERS)
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def fetch_to_file(url, dest):
+    """Stream a URL to dest through the shared session."""
+    part = dest.with_name(dest.name + '.part')
+    with SESSION.get(url, timeout=60, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with open(part, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, 65536)
+    # Only complete files get the final name (dest.exists() means done)
+    part.replace(dest)
 
 
 def download_image(image_id, width=2000):
@@ -31,25 +72,52 @@ def download_image(image_id, width=2000):
     url = f"{IIIF_BASE}/{image_id}/full/{width},/0/default.jpg"
 
     try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=60, context=SSL_CONTEXT) as response:
-            with open(dest, 'wb') as f:
-                f.write(response.read())
+        fetch_to_file(url, dest)
         return image_id, "ok"
     except Exception as e:
         return image_id, f"error: {e}"
 
 
 def load_image_mapping():
-    """Load mapping from filename to IIIF image ID from TSV."""
+    """
+    Load mapping from filename to IIIF image ID from TSV.
+
+    The parsed mapping is pickled to MAPPING_CACHE and reused for as long as
+    the TSV's size and modification time are unchanged.
+    """
     tsv_path = REPO_DIR / "list-images.tsv"
+    stat = tsv_path.stat()
+    key = (stat.st_size, stat.st_mtime_ns)
+
+    try:
+        with open(MAPPING_CACHE, 'rb') as f:
+            cached_key, mapping = pickle.load(f)
+        if cached_key == key:
+            return mapping
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    mapping = parse_image_mapping(tsv_path)
+
+    try:
+        MAPPING_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        with open(MAPPING_CACHE, 'wb') as f:
+            pickle.dump((key, mapping), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+
+    return mapping
+
+
+def parse_image_mapping(tsv_path):
+    """Parse filename -> IIIF image ID pairs from list-images.tsv."""
     mapping = {}
 
     with open(tsv_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        # Skip header
-        for line in lines[1:]:
-            parts = line.strip().split('\t')
+        next(f, None)  # Skip header
+        for line in f:
+            # Only columns 3 and 6 are needed; don't split the rest
+            parts = line.rstrip('\r\n').split('\t', 7)
             if len(parts) >= 7:
                 filename = parts[3]  # FileName column
                 iiif_id = parts[6]   # IIIF image ID column
@@ -68,16 +136,25 @@ def download_image_by_mapping(filename, iiif_id, width=2000):
     url = f"{IIIF_BASE}/{iiif_id}/full/{width},/0/default.jpg"
 
     try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=60, context=SSL_CONTEXT) as response:
-            with open(dest, 'wb') as f:
-                f.write(response.read())
+        fetch_to_file(url, dest)
         return filename, "ok"
     except Exception as e:
         return filename, f"error: {e}"
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Download RASAM images from the BULAC IIIF server")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Parallel download threads (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--verbose", action="store_true", help="Show download progress")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(message)s")
+
+    if args.workers != DEFAULT_WORKERS:
+        mount_adapter(args.workers)
+
     IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 
     print("RASAM Image Downloader")
@@ -95,14 +172,17 @@ def main():
     print(f"XML files: {len(xml_files)}")
     print(f"With IIIF mapping: {len(to_download)}")
     print(f"Output: {IMAGES_DIR}")
-    print(f"Using 4 parallel threads\n")
+    print(f"Using {args.workers} parallel threads\n")
 
-    # Check how many already exist
-    existing = sum(1 for fn, _ in to_download if (IMAGES_DIR / f"{fn}.jpg").exists())
+    # Check how many already exist (one directory listing, no per-file stat)
+    with os.scandir(IMAGES_DIR) as it:
+        present = {entry.name for entry in it}
+    pending = [(fn, iiif_id) for fn, iiif_id in to_download if f"{fn}.jpg" not in present]
+    existing = len(to_download) - len(pending)
     print(f"Already downloaded: {existing}")
-    print(f"Remaining: {len(to_download) - existing}\n")
+    print(f"Remaining: {len(pending)}\n")
 
-    if existing == len(to_download):
+    if not pending:
         print("All images already downloaded!")
         return
 
@@ -110,9 +190,9 @@ def main():
     completed = 0
     errors = 0
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
         futures = {executor.submit(download_image_by_mapping, fn, iiif_id): fn
-                   for fn, iiif_id in to_download}
+                   for fn, iiif_id in pending}
 
         for future in as_completed(futures):
             fn = futures[future]
@@ -121,12 +201,12 @@ def main():
             if status == "ok":
                 completed += 1
                 if completed % 20 == 0:
-                    print(f"  Downloaded: {completed}")
+                    logger.info(f"  Downloaded: {completed}")
             elif status == "exists":
                 pass
             else:
                 errors += 1
-                print(f"  Failed: {result_fn} - {status}")
+                logger.warning(f"  Failed: {result_fn} - {status}")
 
     print(f"\n{'='*50}")
     print(f"Download complete!")
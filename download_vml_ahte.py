@@ -11,20 +11,24 @@ Contains:
 - Crowded diacritics, touching and overlapping characters
 """
 
-import os
+import argparse
+import io
+import logging
 import subprocess
 import shutil
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image
 
+from page_common import PNG_COMPRESS_LEVEL, parse_page_xml, points_bbox
+
 # Configuration
 REPO_URL = "https://github.com/beratkurar/arabic_handwritten_textline_extraction_dataset.git"
 CLONE_DIR = Path("training_data_lines/vml_ahte_raw")
 OUTPUT_DIR = Path("training_data_lines/vml_ahte_lines")
 
-# PAGE XML namespace
-PAGE_NS = {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'}
+# Messages from the crop workers are replayed here by the parent process
+logger = logging.getLogger(__name__)
 
 
 def clone_repo():
@@ -53,154 +57,125 @@ def clone_repo():
         return False
 
 
-def parse_page_xml(xml_path):
-    """Parse PAGE XML and extract text lines with coordinates."""
-    lines = []
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        # Try different namespace versions
-        namespaces = [
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15'},
-        ]
-
-        for ns in namespaces:
-            text_lines = root.findall('.//page:TextLine', ns)
-            if not text_lines:
-                continue
-
-            for textline in text_lines:
-                # Get coordinates
-                coords_elem = textline.find('page:Coords', ns)
-                if coords_elem is None:
-                    continue
-
-                coords_str = coords_elem.get('points', '')
-                if not coords_str:
-                    continue
-
-                # Get text content
-                text_elem = textline.find('page:TextEquiv/page:Unicode', ns)
-                if text_elem is None or text_elem.text is None:
-                    continue
-
-                text = text_elem.text.strip()
-                if not text:
-                    continue
-
-                # Parse coordinates to bounding box
-                points = []
-                for point in coords_str.split():
-                    if ',' in point:
-                        x, y = map(int, point.split(','))
-                        points.append((x, y))
-
-                if points:
-                    xs = [p[0] for p in points]
-                    ys = [p[1] for p in points]
-                    bbox = (min(xs), min(ys), max(xs), max(ys))
-                    lines.append({'bbox': bbox, 'text': text})
-
-            if lines:
-                break
+def find_image_for_xml(xml_path):
+    """Find the page image belonging to a PAGE XML file."""
+    possible_images = [
+        xml_path.with_suffix('.png'),
+        xml_path.with_suffix('.jpg'),
+        xml_path.with_suffix('.tif'),
+        xml_path.with_suffix('.tiff'),
+    ]
 
-    except Exception as e:
-        print(f"  Error parsing {xml_path}: {e}")
+    for p in possible_images:
+        if p.exists():
+            return p
 
-    return lines
+    # Try looking in different locations
+    for ext in ['.png', '.jpg', '.tif', '.tiff']:
+        matches = list(xml_path.parent.glob(f"{xml_path.stem}*{ext}"))
+        if matches:
+            return matches[0]
 
+    return None
 
-def extract_lines():
-    """Extract text lines from page images using PAGE XML coordinates."""
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    total_lines = 0
+def crop_page_lines(xml_path):
+    """
+    Crop and PNG-encode the text lines of one page.
 
-    # Look for PAGE XML files
-    xml_files = list(CLONE_DIR.rglob("*.xml"))
-    print(f"Found {len(xml_files)} XML files")
+    Runs in a worker process. Returns (messages, crops): messages are
+    (log level, text) pairs for the parent to log, crops a list of
+    (png_bytes, text) in page order.
+    Files are written by the parent so output numbering stays sequential.
+    """
+    messages = []
+    crops = []
 
-    for xml_path in xml_files:
-        print(f"\nProcessing: {xml_path.name}")
-
-        # Find corresponding image
-        possible_images = [
-            xml_path.with_suffix('.png'),
-            xml_path.with_suffix('.jpg'),
-            xml_path.with_suffix('.tif'),
-            xml_path.with_suffix('.tiff'),
-        ]
-
-        img_path = None
-        for p in possible_images:
-            if p.exists():
-                img_path = p
-                break
-
-        if img_path is None:
-            # Try looking in different locations
-            for ext in ['.png', '.jpg', '.tif', '.tiff']:
-                matches = list(xml_path.parent.glob(f"{xml_path.stem}*{ext}"))
-                if matches:
-                    img_path = matches[0]
-                    break
-
-        if img_path is None:
-            print(f"  No image found for {xml_path.name}")
-            continue
+    img_path = find_image_for_xml(xml_path)
+    if img_path is None:
+        messages.append((logging.WARNING, f"  No image found for {xml_path.name}"))
+        return messages, crops
 
-        # Parse XML
-        lines = parse_page_xml(xml_path)
-        print(f"  Found {len(lines)} text lines")
+    # Parse XML
+    lines, _, _ = parse_page_xml(xml_path)
+    messages.append((logging.INFO, f"  Found {len(lines)} text lines"))
 
-        if not lines:
+    if not lines:
+        return messages, crops
+
+    # Load image
+    try:
+        img = Image.open(img_path)
+        # JPEG pages: decode straight to grayscale (no-op for PNG/TIFF)
+        img.draft('L', img.size)
+        if img.mode != 'L':
+            img = img.convert('L')
+    except Exception as e:
+        messages.append((logging.WARNING, f"  Error loading image: {e}"))
+        return messages, crops
+
+    # Extract each line
+    for line_data in lines:
+        bbox = points_bbox(line_data['points'])
+        text = line_data['text']
+
+        # Add padding
+        padding = 5
+        x1 = max(0, bbox[0] - padding)
+        y1 = max(0, bbox[1] - padding)
+        x2 = min(img.width, bbox[2] + padding)
+        y2 = min(img.height, bbox[3] + padding)
+
+        # Check minimum size
+        if (x2 - x1) < 30 or (y2 - y1) < 10:
             continue
 
-        # Load image
         try:
-            img = Image.open(img_path)
-            if img.mode != 'L':
-                img = img.convert('L')
+            buf = io.BytesIO()
+            img.crop((x1, y1, x2, y2)).save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+            crops.append((buf.getvalue(), text))
         except Exception as e:
-            print(f"  Error loading image: {e}")
-            continue
+            messages.append((logging.WARNING, f"  Error extracting line: {e}"))
 
-        # Extract each line
-        for line_data in lines:
-            bbox = line_data['bbox']
-            text = line_data['text']
+    return messages, crops
 
-            # Add padding
-            padding = 5
-            x1 = max(0, bbox[0] - padding)
-            y1 = max(0, bbox[1] - padding)
-            x2 = min(img.width, bbox[2] + padding)
-            y2 = min(img.height, bbox[3] + padding)
 
-            # Check minimum size
-            if (x2 - x1) < 30 or (y2 - y1) < 10:
-                continue
+def extract_lines():
+    """Extract text lines from page images using PAGE XML coordinates."""
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-            try:
-                line_img = img.crop((x1, y1, x2, y2))
+    total_lines = 0
 
+    # Look for PAGE XML files
+    xml_files = list(CLONE_DIR.rglob("*.xml"))
+    print(f"Found {len(xml_files)} XML files")
+
+    # Pages are cropped and encoded in parallel, one process per XML file
+    with ProcessPoolExecutor() as executor:
+        for xml_path, (messages, crops) in zip(xml_files, executor.map(crop_page_lines, xml_files)):
+            logger.info(f"\nProcessing: {xml_path.name}")
+            for level, message in messages:
+                logger.log(level, message)
+
+            for png_bytes, text in crops:
                 out_png = OUTPUT_DIR / f"vml_ahte_{total_lines:05d}.png"
                 out_gt = OUTPUT_DIR / f"vml_ahte_{total_lines:05d}.gt.txt"
 
-                line_img.save(out_png)
+                out_png.write_bytes(png_bytes)
                 out_gt.write_text(text, encoding='utf-8')
                 total_lines += 1
 
-            except Exception as e:
-                print(f"  Error extracting line: {e}")
-
     return total_lines
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Download VML-AHTE and extract line images")
+    parser.add_argument("--verbose", action="store_true", help="Show per-page progress")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(message)s")
+
     print("=" * 60)
     print("VML-AHTE Dataset Downloader")
     print("Arabic Handwritten Text Line Extraction Database")
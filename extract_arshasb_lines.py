@@ -8,27 +8,83 @@ This script:
 4. Saves as image + .gt.txt pairs for Kraken training
 """
 
+import argparse
+import logging
 import os
 import re
 import glob
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from PIL import Image
-import pandas as pd
+import numpy as np
+import openpyxl
+
+from page_common import PNG_COMPRESS_LEVEL
 
 # Configuration
 SOURCE_DIR = "training_data_lines/Arshasb_7k"
 OUTPUT_DIR = "training_data_lines/Arshasb_extracted"
 PADDING = 5  # Extra pixels around line crop
+POINT_COLUMNS = ['point1', 'point2', 'point3', 'point4']
+ARRAY_MODES = ('L', 'RGB', 'RGBA')  # Modes that round-trip through np.asarray
+
+# Point cells look like "(2, 17)"
+POINT_RE = re.compile(r'\((\d+),\s*(\d+)\)')
+
+# Skipped folders are INFO (--verbose); unreadable page files are warnings
+logger = logging.getLogger(__name__)
 
 
-def parse_point(point_str):
-    """Parse point string like '(2, 17)' to tuple (2, 17)"""
-    if isinstance(point_str, tuple):
-        return point_str
-    match = re.match(r'\((\d+),\s*(\d+)\)', str(point_str))
-    if match:
-        return (int(match.group(1)), int(match.group(2)))
-    return None
+def read_line_sheet(xlsx_path):
+    """
+    Read a line-coordinate sheet in one read-only openpyxl pass.
+
+    Returns (header, rows): header is the list of column names, rows a list
+    of value tuples with fully empty rows dropped.
+    """
+    wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h) if h is not None else '' for h in next(rows, ())]
+        return header, [row for row in rows if any(v is not None for v in row)]
+    finally:
+        wb.close()
+
+
+def sheet_line_boxes(header, rows, width, height):
+    """
+    Padded, clamped crop boxes for every row of a line-coordinate sheet.
+
+    Parses all four point columns into an (N, 4, 2) array and returns
+    (boxes, valid): boxes is (N, 4) [left, top, right, bottom], valid marks
+    rows whose four points all parsed.
+    """
+    col_idx = [header.index(col) for col in POINT_COLUMNS]
+
+    points = np.zeros((len(rows), 4, 2), dtype=np.int64)
+    valid = np.ones(len(rows), dtype=bool)
+    for i, row in enumerate(rows):
+        for j, c in enumerate(col_idx):
+            cell = row[c]
+            if isinstance(cell, tuple):
+                points[i, j] = cell
+                continue
+            match = POINT_RE.match(cell) if isinstance(cell, str) else None
+            if match is None:
+                valid[i] = False
+                break
+            points[i, j] = match.groups()
+
+    mins = points.min(axis=1)
+    maxs = points.max(axis=1)
+
+    boxes = np.empty((len(rows), 4), dtype=np.int64)
+    boxes[:, 0] = np.maximum(0, mins[:, 0] - PADDING)
+    boxes[:, 1] = np.maximum(0, mins[:, 1] - PADDING)
+    boxes[:, 2] = np.minimum(width, maxs[:, 0] + PADDING)
+    boxes[:, 3] = np.minimum(height, maxs[:, 1] + PADDING)
+    return boxes, valid
 
 
 def extract_lines_from_page(page_folder, output_dir, page_num):
@@ -42,21 +98,24 @@ def extract_lines_from_page(page_folder, output_dir, page_num):
     fulltext = os.path.join(page_folder, f"fulltext_{num}.txt")
 
     if not all(os.path.exists(f) for f in [page_img, line_xlsx, fulltext]):
-        print(f"  Missing files in {folder_name}, skipping")
+        logger.info(f"  Missing files in {folder_name}, skipping")
         return 0
 
-    # Load page image
+    # Load page image. Decode it fully up front: every line crop below is then
+    # O(line) work on the shared pixel buffer, and a corrupt page is reported
+    # here instead of failing halfway through the crops.
     try:
         img = Image.open(page_img)
+        img.load()
     except Exception as e:
-        print(f"  Error loading image: {e}")
+        logger.warning(f"  {folder_name}: error loading image: {e}")
         return 0
 
     # Load line coordinates
     try:
-        df = pd.read_excel(line_xlsx)
+        header, rows = read_line_sheet(line_xlsx)
     except Exception as e:
-        print(f"  Error loading Excel: {e}")
+        logger.warning(f"  {folder_name}: error loading Excel: {e}")
         return 0
 
     # Load fulltext (line-by-line transcription)
@@ -66,14 +125,28 @@ def extract_lines_from_page(page_folder, output_dir, page_num):
         # Skip first line (page number) and strip whitespace
         text_lines = [line.strip() for line in text_lines[1:] if line.strip()]
     except Exception as e:
-        print(f"  Error loading fulltext: {e}")
+        logger.warning(f"  {folder_name}: error loading fulltext: {e}")
         return 0
 
     extracted = 0
 
-    for idx, row in df.iterrows():
-        line_num = row.get('line', idx + 1)
+    # View the decoded page as an array; line crops are slices of it.
+    # Palette and other modes keep using PIL's crop.
+    page = np.asarray(img) if img.mode in ARRAY_MODES else None
 
+    try:
+        boxes, valid = sheet_line_boxes(header, rows, img.width, img.height)
+    except ValueError as e:
+        logger.warning(f"  {folder_name}: error reading coordinates: {e}")
+        return 0
+
+    if 'line' in header:
+        line_col = header.index('line')
+        line_nums = [row[line_col] for row in rows]
+    else:
+        line_nums = range(1, len(rows) + 1)
+
+    for idx, line_num in enumerate(line_nums):
         # Get text for this line
         if idx >= len(text_lines):
             continue
@@ -82,40 +155,31 @@ def extract_lines_from_page(page_folder, output_dir, page_num):
         if not text or len(text) < 2:
             continue
 
-        # Parse coordinates
-        p1 = parse_point(row['point1'])
-        p2 = parse_point(row['point2'])
-        p3 = parse_point(row['point3'])
-        p4 = parse_point(row['point4'])
-
-        if not all([p1, p2, p3, p4]):
+        if not valid[idx]:
             continue
 
-        # Calculate bounding box
-        all_x = [p1[0], p2[0], p3[0], p4[0]]
-        all_y = [p1[1], p2[1], p3[1], p4[1]]
+        left, top, right, bottom = boxes[idx].tolist()
 
-        left = max(0, min(all_x) - PADDING)
-        top = max(0, min(all_y) - PADDING)
-        right = min(img.width, max(all_x) + PADDING)
-        bottom = min(img.height, max(all_y) + PADDING)
+        # Skip very small crops
+        if right - left < 50 or bottom - top < 10:
+            continue
 
-        # Crop line
+        # Crop line: slice the page array decoded once per page (fromarray
+        # copies the non-contiguous slice); other modes go through PIL crop
         try:
-            line_img = img.crop((left, top, right, bottom))
+            if page is not None:
+                line_img = Image.fromarray(page[top:bottom, left:right])
+            else:
+                line_img = img.crop((left, top, right, bottom))
         except Exception as e:
             continue
 
-        # Skip very small crops
-        if line_img.width < 50 or line_img.height < 10:
-            continue
-
         # Save files
         out_name = f"arshasb_{num}_line{line_num:03d}"
         out_img_path = os.path.join(output_dir, f"{out_name}.png")
         out_gt_path = os.path.join(output_dir, f"{out_name}.gt.txt")
 
-        line_img.save(out_img_path)
+        line_img.save(out_img_path, compress_level=PNG_COMPRESS_LEVEL)
         with open(out_gt_path, 'w', encoding='utf-8') as f:
             f.write(text)
 
@@ -124,7 +188,19 @@ def extract_lines_from_page(page_folder, output_dir, page_num):
     return extracted
 
 
+def configure_logging(level):
+    """Set up logging; also used as the process pool initializer."""
+    logging.basicConfig(level=level, format="%(message)s")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Extract line images from Arshasb_7k")
+    parser.add_argument("--verbose", action="store_true", help="Report skipped pages")
+    args = parser.parse_args()
+
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    configure_logging(log_level)
+
     print("="*60)
     print("Extracting lines from Arshasb_7k dataset")
     print("="*60)
@@ -142,12 +218,19 @@ def main():
 
     total_lines = 0
 
-    for i, folder in enumerate(page_folders):
-        if (i + 1) % 100 == 0 or i == 0:
-            print(f"Processing page {i+1}/{len(page_folders)}...")
+    # Pages are independent (output names come from the page folder), so
+    # they are processed in parallel; results arrive in page order.
+    with ProcessPoolExecutor(initializer=configure_logging,
+                             initargs=(log_level,)) as executor:
+        results = executor.map(extract_lines_from_page, page_folders,
+                               repeat(OUTPUT_DIR), range(len(page_folders)),
+                               chunksize=8)
+
+        for i, extracted in enumerate(results):
+            if (i + 1) % 100 == 0 or i == 0:
+                print(f"Processing page {i+1}/{len(page_folders)}...")
 
-        extracted = extract_lines_from_page(folder, OUTPUT_DIR, i)
-        total_lines += extracted
+            total_lines += extracted
 
     print()
     print("="*60)
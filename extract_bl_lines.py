@@ -12,13 +12,19 @@ PAGE XML format:
 """
 
 import os
-import re
-import glob
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image
+import numpy as np
 import warnings
 
+from page_common import PNG_COMPRESS_LEVEL, line_boxes, parse_page_xml, write_gt
+
+try:
+    import pyvips  # Optional: region-wise decoding of large TIFF pages
+except (ImportError, OSError):  # OSError: libvips binaries not found
+    pyvips = None
+
 # Suppress PIL warnings for large images
 warnings.filterwarnings('ignore', category=Image.DecompressionBombWarning)
 Image.MAX_IMAGE_PIXELS = None  # Allow large TIFF files
@@ -28,168 +34,74 @@ SOURCE_DIR = "training_data_lines/british_library_arabic"
 OUTPUT_DIR = "training_data_lines/bl_extracted_lines"
 PADDING = 10  # Pixels to add around each line crop
 
-# PAGE XML namespace
-PAGE_NS = {
-    'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15',
-    'page2017': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15',
-    'page2019': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15',
-}
-
-
-def parse_coords(coords_str):
-    """Parse coordinate string like '100,200 150,200 150,250 100,250' to list of (x,y) tuples."""
-    points = []
-    for point in coords_str.strip().split():
-        if ',' in point:
-            x, y = point.split(',')
-            points.append((int(x), int(y)))
-    return points
-
-
-def get_bounding_box(points):
-    """Get bounding box from list of points."""
-    if not points:
-        return None
-    xs = [p[0] for p in points]
-    ys = [p[1] for p in points]
-    return (min(xs), min(ys), max(xs), max(ys))
-
-
-def parse_page_xml(xml_path):
-    """Parse PAGE XML and extract text lines with coordinates and transcriptions."""
-    lines = []
-
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        # Try to detect namespace
-        ns = None
-        for prefix, uri in PAGE_NS.items():
-            if uri in root.tag or root.find(f'.//{{{uri}}}TextLine') is not None:
-                ns = {'ns': uri}
-                break
-
-        # Try without namespace if not found
-        if ns is None:
-            # Check if namespace is in root tag
-            match = re.match(r'\{(.+?)\}', root.tag)
-            if match:
-                ns = {'ns': match.group(1)}
-            else:
-                ns = {}
-
-        # Find all TextLine elements
-        if ns:
-            text_lines = root.findall('.//ns:TextLine', ns)
-            if not text_lines:
-                # Try alternative paths
-                text_lines = root.findall('.//{%s}TextLine' % ns.get('ns', ''))
-        else:
-            text_lines = root.findall('.//TextLine')
-
-        # Also try without namespace prefix
-        if not text_lines:
-            for elem in root.iter():
-                if elem.tag.endswith('TextLine'):
-                    text_lines.append(elem)
-
-        for line_elem in text_lines:
-            line_data = {'coords': None, 'text': None, 'id': None}
-
-            # Get line ID
-            line_data['id'] = line_elem.get('id', '')
-
-            # Get coordinates
-            coords_elem = None
-            for child in line_elem:
-                if child.tag.endswith('Coords'):
-                    coords_elem = child
-                    break
-
-            if coords_elem is not None:
-                points_str = coords_elem.get('points', '')
-                if points_str:
-                    points = parse_coords(points_str)
-                    line_data['coords'] = get_bounding_box(points)
-
-            # Get transcription
-            for child in line_elem:
-                if child.tag.endswith('TextEquiv'):
-                    for subchild in child:
-                        if subchild.tag.endswith('Unicode'):
-                            line_data['text'] = subchild.text
-                            break
-                    break
-
-            # Only add if we have both coordinates and text
-            if line_data['coords'] and line_data['text']:
-                lines.append(line_data)
-
-    except ET.ParseError as e:
-        print(f"  XML parse error in {xml_path}: {e}")
-    except Exception as e:
-        print(f"  Error processing {xml_path}: {e}")
-
-    return lines
-
+# Image files looked up for each XML file, in order of preference (matched
+# case-insensitively)
+IMAGE_EXTENSIONS = ('.tif', '.tiff', '.png', '.jpg', '.jpeg')
+EXTENSION_RANK = {ext: rank for rank, ext in enumerate(IMAGE_EXTENSIONS)}
 
 def extract_lines_from_page(image_path, xml_path, output_dir, page_id):
     """Extract all lines from a page image using PAGE XML annotations."""
-    lines = parse_page_xml(xml_path)
+    lines, _, _ = parse_page_xml(xml_path)
 
     if not lines:
         print(f"  No lines found in {xml_path}")
         return 0
 
-    # Load image
+    # Load image. pyvips (if installed) only decodes the regions that are
+    # cropped; Pillow decodes the whole page
     try:
-        img = Image.open(image_path)
-        # Convert to RGB if needed (TIFF might be in different modes)
-        if img.mode not in ['RGB', 'L']:
-            img = img.convert('RGB')
+        if pyvips is not None:
+            img = pyvips.Image.new_from_file(image_path)
+            img_width, img_height = img.width, img.height
+        else:
+            img = Image.open(image_path)
+            # Convert the whole page to grayscale once (TIFF might be in
+            # different modes) instead of converting every line crop
+            if img.mode != 'L':
+                img = img.convert('L')
+            img_width, img_height = img.size
+
+            # Decode the page once; line crops are slices of this array
+            page = np.asarray(img)
     except Exception as e:
         print(f"  Error loading image {image_path}: {e}")
         return 0
 
     extracted = 0
-    img_width, img_height = img.size
 
-    for i, line in enumerate(lines):
-        bbox = line['coords']
+    # Pad and clamp every line box of the page in one go; very small crops
+    # are dropped here
+    boxes, keep = line_boxes(lines, img_width, img_height,
+                             padding=PADDING, min_width=50, min_height=10)
+
+    for i in np.flatnonzero(keep).tolist():
+        line = lines[i]
         text = line['text'].strip()
 
         # Skip empty or very short transcriptions
         if not text or len(text) < 2:
             continue
 
-        # Apply padding and ensure within bounds
-        left = max(0, bbox[0] - PADDING)
-        top = max(0, bbox[1] - PADDING)
-        right = min(img_width, bbox[2] + PADDING)
-        bottom = min(img_height, bbox[3] + PADDING)
-
-        # Skip very small crops
-        if (right - left) < 50 or (bottom - top) < 10:
-            continue
+        left, top, right, bottom = boxes[i].tolist()
 
         # Crop line
         try:
-            line_img = img.crop((left, top, right, bottom))
-
-            # Convert to grayscale for consistency
-            if line_img.mode != 'L':
-                line_img = line_img.convert('L')
-
-            # Save files
             line_id = line.get('id', f'line{i:03d}')
             out_name = f"bl_{page_id}_{line_id}"
             out_img_path = os.path.join(output_dir, f"{out_name}.png")
             out_gt_path = os.path.join(output_dir, f"{out_name}.gt.txt")
 
-            line_img.save(out_img_path)
-            with open(out_gt_path, 'w', encoding='utf-8') as f:
-                f.write(text)
+            if pyvips is not None:
+                # Grayscale, first band only (drops any alpha channel)
+                line_img = img.crop(left, top, right - left, bottom - top)
+                line_img = line_img.colourspace('b-w')[0]
+                line_img.pngsave(out_img_path, compression=PNG_COMPRESS_LEVEL)
+            else:
+                line_img = Image.fromarray(page[top:bottom, left:right])
+                line_img.save(out_img_path, compress_level=PNG_COMPRESS_LEVEL)
+
+            # Save transcription
+            write_gt(out_gt_path, text)
 
             extracted += 1
 
@@ -200,26 +112,63 @@ def extract_lines_from_page(image_path, xml_path, output_dir, page_id):
     return extracted
 
 
-def find_image_for_xml(xml_path, source_dir):
-    """Find the corresponding image file for an XML file."""
-    xml_name = Path(xml_path).stem
-
-    # Common patterns: file.xml -> file.tif, file.tiff, file.png, file.jpg
-    extensions = ['.tif', '.tiff', '.TIF', '.TIFF', '.png', '.PNG', '.jpg', '.JPG', '.jpeg']
-
-    for ext in extensions:
-        # Same directory
-        img_path = Path(xml_path).with_suffix(ext)
-        if img_path.exists():
-            return str(img_path)
+def scan_source_dir(source_dir):
+    """
+    Find the XML files and page images under source_dir in one os.scandir walk.
+
+    Returns (xml_files, image_paths): xml_files is sorted and image_paths[i]
+    is the page image for xml_files[i], or None. An image in the XML file's
+    own directory is preferred over one with the same stem elsewhere; when a
+    stem has several images, the extension listed first in IMAGE_EXTENSIONS
+    wins.
+    """
+    xml_files = []
+    # (rank, path) of the best image per (directory, lower-cased stem) and
+    # per stem anywhere under source_dir
+    by_dir = {}
+    by_stem = {}
+    stack = [source_dir]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                stem, ext = os.path.splitext(entry.name.lower())
+                if ext == '.xml':
+                    xml_files.append(entry.path)
+                    continue
+                rank = EXTENSION_RANK.get(ext)
+                if rank is None:
+                    continue
+                for index, key in ((by_dir, (current, stem)), (by_stem, stem)):
+                    if key not in index or rank < index[key][0]:
+                        index[key] = (rank, entry.path)
+    xml_files.sort()
+
+    image_paths = []
+    for xml_path in xml_files:
+        directory, name = os.path.split(xml_path)
+        stem = os.path.splitext(name.lower())[0]
+        found = by_dir.get((directory, stem)) or by_stem.get(stem)
+        image_paths.append(found[1] if found else None)
+    return xml_files, image_paths
+
+
+def process_page(i, xml_path, image_path):
+    """
+    Extract the lines of the i-th XML file; runs in a worker process.
+
+    Returns the number of lines extracted, or None if there is no page image.
+    """
+    if not image_path:
+        return None
 
-        # Search in source directory
-        pattern = os.path.join(source_dir, '**', xml_name + ext)
-        matches = glob.glob(pattern, recursive=True)
-        if matches:
-            return matches[0]
+    # Generate unique page ID
+    page_id = f"p{i+1:03d}"
 
-    return None
+    return extract_lines_from_page(image_path, xml_path, OUTPUT_DIR, page_id)
 
 
 def main():
@@ -230,8 +179,10 @@ def main():
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Find all XML files
-    xml_files = glob.glob(os.path.join(SOURCE_DIR, '**', '*.xml'), recursive=True)
+    # Find all XML files and page images (one directory walk for both)
+    xml_files, image_paths = [], []
+    if os.path.isdir(SOURCE_DIR):
+        xml_files, image_paths = scan_source_dir(SOURCE_DIR)
 
     if not xml_files:
         print(f"No XML files found in {SOURCE_DIR}")
@@ -250,30 +201,26 @@ def main():
     total_lines = 0
     processed_pages = 0
 
-    for i, xml_path in enumerate(xml_files):
-        xml_name = Path(xml_path).stem
-
-        # Find corresponding image
-        image_path = find_image_for_xml(xml_path, SOURCE_DIR)
+    # Pages are independent (page IDs come from the XML index), so they are
+    # extracted in parallel; results arrive in XML order
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(process_page, range(len(xml_files)), xml_files, image_paths)
 
-        if not image_path:
-            print(f"[{i+1}/{len(xml_files)}] {xml_name}: No image found, skipping")
-            continue
-
-        print(f"[{i+1}/{len(xml_files)}] Processing {xml_name}...")
+        for i, (xml_path, extracted) in enumerate(zip(xml_files, results)):
+            xml_name = Path(xml_path).stem
 
-        # Generate unique page ID
-        page_id = f"p{i+1:03d}"
+            if extracted is None:
+                print(f"[{i+1}/{len(xml_files)}] {xml_name}: No image found, skipping")
+                continue
 
-        # Extract lines
-        extracted = extract_lines_from_page(image_path, xml_path, OUTPUT_DIR, page_id)
+            print(f"[{i+1}/{len(xml_files)}] Processed {xml_name}")
 
-        if extracted > 0:
-            print(f"  Extracted {extracted} lines")
-            total_lines += extracted
-            processed_pages += 1
-        else:
-            print(f"  No lines extracted")
+            if extracted > 0:
+                print(f"  Extracted {extracted} lines")
+                total_lines += extracted
+                processed_pages += 1
+            else:
+                print(f"  No lines extracted")
 
     print()
     print("=" * 60)
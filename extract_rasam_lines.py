@@ -5,97 +5,104 @@ Extract line images from RASAM dataset (cloned repo).
 - Saves as PNG + .gt.txt for Kraken training
 """
 
-import xml.etree.ElementTree as ET
-from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-import urllib.request
+import numpy as np
 import io
+import threading
 import time
 
-BASE_DIR = Path(__file__).parent
-REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from page_common import (BASE_DIR, REPO_DIR, PNG_COMPRESS_LEVEL, find_page_xml, line_boxes,
+                         parse_page_xml, write_gt)
+
 OUTPUT_DIR = BASE_DIR / "training_data_lines" / "rasam_lines"
 
 # IIIF server base URL
 IIIF_BASE = "https://bina.bulac.fr/iiif/2"
 
+# Downloads are latency-bound, so several pages are fetched at once; this
+# is also the most requests in flight to the IIIF server
+DEFAULT_WORKERS = 8
 
-def parse_page_xml(xml_path):
-    """Parse PAGE XML and extract text lines with coordinates."""
-    lines = []
+# Be nice to the server: minimum gap between IIIF requests, across all
+# fetch threads
+REQUEST_INTERVAL = 0.3
 
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        # Try different namespace versions
-        namespaces = [
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15'},
-        ]
-
-        for ns in namespaces:
-            for textline in root.findall('.//page:TextLine', ns):
-                coords_elem = textline.find('page:Coords', ns)
-                if coords_elem is None:
-                    continue
+# Threads encoding line PNGs while the main thread keeps cropping
+ENCODE_WORKERS = 4
 
-                coords_str = coords_elem.get('points', '')
-                if not coords_str:
-                    continue
+# Shared session: fetch threads reuse keep-alive connections to the IIIF
+# server instead of paying a new TCP+TLS handshake for every image
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=DEFAULT_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.5),
+))
 
-                # Get text
-                text_elem = textline.find('page:TextEquiv/page:Unicode', ns)
-                if text_elem is None or text_elem.text is None:
-                    continue
+# Start time of the next allowed IIIF request, shared by the fetch threads
+_rate_lock = threading.Lock()
+_next_request = 0.0
 
-                text = text_elem.text.strip()
-                if not text:
-                    continue
 
-                # Parse coordinates to bounding box
-                points = []
-                for point in coords_str.split():
-                    try:
-                        x, y = map(float, point.split(','))
-                        points.append((int(x), int(y)))
-                    except:
-                        continue
-
-                if points:
-                    xs = [p[0] for p in points]
-                    ys = [p[1] for p in points]
-                    bbox = (min(xs), min(ys), max(xs), max(ys))
-                    lines.append({'bbox': bbox, 'text': text})
-
-            if lines:
-                break
-
-    except Exception as e:
-        print(f"    XML parse error: {e}")
-
-    return lines
+def wait_for_request_slot():
+    """Block until the pool-wide rate limit allows another IIIF request."""
+    global _next_request
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_request - now
+        _next_request = max(now, _next_request) + REQUEST_INTERVAL
+    if wait > 0:
+        time.sleep(wait)
 
 
 def download_iiif_image(image_id, width=2000):
     """Download image from BULAC IIIF server."""
     url = f"{IIIF_BASE}/{image_id}/full/{width},/0/default.jpg"
     try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=60) as response:
-            return Image.open(io.BytesIO(response.read()))
-    except Exception as e:
+        wait_for_request_slot()
+        response = SESSION.get(url, timeout=60)
+        response.raise_for_status()
+        return Image.open(io.BytesIO(response.content))
+    except Exception:
         # Try smaller size
         try:
             url = f"{IIIF_BASE}/{image_id}/full/1000,/0/default.jpg"
-            req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urllib.request.urlopen(req, timeout=60) as response:
-                return Image.open(io.BytesIO(response.read()))
+            wait_for_request_slot()
+            response = SESSION.get(url, timeout=60)
+            response.raise_for_status()
+            return Image.open(io.BytesIO(response.content))
         except:
             return None
 
 
+def encode_png(line_img):
+    """PNG-encode a line image to bytes; runs on the encoder threads."""
+    buf = io.BytesIO()
+    line_img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return buf.getvalue()
+
+
+def fetch_page(xml_path):
+    """
+    Parse one PAGE XML file and download its IIIF image if it has lines.
+
+    Returns (lines, img); run from a thread pool so several images are
+    downloaded at once, within the REQUEST_INTERVAL rate limit.
+    """
+    lines, _, _ = parse_page_xml(xml_path)
+    if not lines:
+        return lines, None
+
+    return lines, download_iiif_image(xml_path.stem)
+
+
 def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -103,89 +110,93 @@ def main():
     print("="*50)
 
     # Find all PAGE XML files
-    xml_files = list(REPO_DIR.glob("page/**/*.xml"))
+    xml_files = find_page_xml(REPO_DIR)
     print(f"Found {len(xml_files)} PAGE XML files\n")
 
     total_lines = 0
     total_pages = 0
     failed_downloads = 0
 
-    for i, xml_path in enumerate(xml_files):
-        # Get image ID from filename
-        image_id = xml_path.stem
-
-        print(f"[{i+1}/{len(xml_files)}] {image_id}")
-
-        # Parse XML
-        lines = parse_page_xml(xml_path)
-        if not lines:
-            print(f"    No lines found")
-            continue
-
-        print(f"    Found {len(lines)} lines")
+    with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as executor, \
+            ThreadPoolExecutor(max_workers=ENCODE_WORKERS) as encoder:
+        # Only a few decoded pages are in flight at a time, so memory stays
+        # bounded; pages are taken in order, so output numbering is deterministic
+        pending = deque()
+        next_idx = 0
 
-        # Download image from IIIF
-        print(f"    Downloading image...")
-        img = download_iiif_image(image_id)
+        for i, xml_path in enumerate(xml_files):
+            while next_idx < len(xml_files) and len(pending) < 2 * DEFAULT_WORKERS:
+                pending.append(executor.submit(fetch_page, xml_files[next_idx]))
+                next_idx += 1
+            lines, img = pending.popleft().result()
+            image_id = xml_path.stem
 
-        if img is None:
-            print(f"    Failed to download image")
-            failed_downloads += 1
-            continue
+            print(f"[{i+1}/{len(xml_files)}] {image_id}")
 
-        # Convert to grayscale
-        if img.mode != 'L':
-            img = img.convert('L')
-
-        # Get scale factor (IIIF might return different size)
-        # We assume the coordinates in XML match the full resolution
-
-        # Extract each line
-        lines_saved = 0
-        for line_data in lines:
-            bbox = line_data['bbox']
-            text = line_data['text']
+            if not lines:
+                print(f"    No lines found")
+                continue
 
-            # Add padding
-            padding = 5
-            x1 = max(0, bbox[0] - padding)
-            y1 = max(0, bbox[1] - padding)
-            x2 = min(img.width, bbox[2] + padding)
-            y2 = min(img.height, bbox[3] + padding)
+            print(f"    Found {len(lines)} lines")
 
-            # Skip invalid boxes
-            if x2 <= x1 or y2 <= y1:
+            if img is None:
+                print(f"    Failed to download image")
+                failed_downloads += 1
                 continue
 
-            try:
-                line_img = img.crop((x1, y1, x2, y2))
-
-                # Skip very small images
-                if line_img.width < 20 or line_img.height < 10:
+            # Convert to grayscale
+            if img.mode != 'L':
+                img = img.convert('L')
+
+            # Decode the page once; line crops are slices of this array
+            page = np.asarray(img)
+
+            # Get scale factor (IIIF might return different size)
+            # We assume the coordinates in XML match the full resolution
+
+            # Extract each line; PNG encoding (which releases the GIL) runs on
+            # the encoder threads while the next line is cropped
+            encodes = []
+
+            # Add padding, clamp to the image and skip very small boxes, for
+            # all lines at once
+            boxes, keep = line_boxes(lines, img.width, img.height,
+                                     padding=5, min_width=20, min_height=10)
+
+            for idx in np.flatnonzero(keep):
+                x1, y1, x2, y2 = boxes[idx].tolist()
+                text = lines[idx]['text']
+
+                try:
+                    line_img = Image.fromarray(page[y1:y2, x1:x2])
+                    encodes.append((encoder.submit(encode_png, line_img), text))
+                except Exception:
+                    pass
+
+            # Save in line order; a line is numbered and gets its .gt.txt
+            # only once its PNG encoded
+            lines_saved = 0
+            for future, text in encodes:
+                try:
+                    png_bytes = future.result()
+                except Exception:
                     continue
 
-                # Save
                 out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
                 out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
 
-                line_img.save(out_png)
-                out_gt.write_text(text, encoding='utf-8')
+                out_png.write_bytes(png_bytes)
+                write_gt(out_gt, text)
 
                 total_lines += 1
                 lines_saved += 1
 
-            except Exception as e:
-                pass
-
-        print(f"    Saved {lines_saved} lines")
-        total_pages += 1
-
-        # Be nice to the server
-        time.sleep(0.3)
+            print(f"    Saved {lines_saved} lines")
+            total_pages += 1
 
-        # Progress update
-        if (i + 1) % 50 == 0:
-            print(f"\n--- Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines ---\n")
+            # Progress update
+            if (i + 1) % 50 == 0:
+                print(f"\n--- Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines ---\n")
 
     print(f"\n{'='*50}")
     print(f"RASAM extraction complete!")
@@ -3,69 +3,69 @@ Extract line images from RASAM dataset using locally downloaded images.
 Run download_rasam_images.py first!
 """
 
-import xml.etree.ElementTree as ET
-from pathlib import Path
+import io
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+import numpy as np
+
+from page_common import (BASE_DIR, REPO_DIR, IMAGES_DIR, PNG_COMPRESS_LEVEL,
+                         downloaded_image_stems, find_page_xml, line_boxes,
+                         parse_page_xml, write_gt)
 
-BASE_DIR = Path(__file__).parent
-REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
-IMAGES_DIR = BASE_DIR / "training_data_lines" / "rasam_images"
 OUTPUT_DIR = BASE_DIR / "training_data_lines" / "rasam_lines"
 
 
-def parse_page_xml(xml_path):
-    """Parse PAGE XML and extract text lines with coordinates."""
-    lines = []
+def crop_page_lines(xml_path):
+    """
+    Crop and PNG-encode the text lines of one page.
 
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        namespaces = [
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15'},
-        ]
-
-        for ns in namespaces:
-            for textline in root.findall('.//page:TextLine', ns):
-                coords_elem = textline.find('page:Coords', ns)
-                if coords_elem is None:
-                    continue
-
-                coords_str = coords_elem.get('points', '')
-                if not coords_str:
-                    continue
-
-                text_elem = textline.find('page:TextEquiv/page:Unicode', ns)
-                if text_elem is None or text_elem.text is None:
-                    continue
-
-                text = text_elem.text.strip()
-                if not text:
-                    continue
-
-                points = []
-                for point in coords_str.split():
-                    try:
-                        x, y = map(float, point.split(','))
-                        points.append((int(x), int(y)))
-                    except:
-                        continue
-
-                if points:
-                    xs = [p[0] for p in points]
-                    ys = [p[1] for p in points]
-                    bbox = (min(xs), min(ys), max(xs), max(ys))
-                    lines.append({'bbox': bbox, 'text': text})
-
-            if lines:
-                break
+    Runs in a worker process. Returns a list of (png_bytes, text) in page
+    order, or None if the page was skipped. Files are written by the parent
+    so output numbering stays sequential.
+    """
+    image_id = xml_path.stem
+    img_path = IMAGES_DIR / f"{image_id}.jpg"
+
+    # Parse XML
+    lines, _, _ = parse_page_xml(xml_path)
+    if not lines:
+        return None
 
+    # Open image
+    try:
+        img = Image.open(img_path)
+        # Let libjpeg decode straight to grayscale; convert() is then a no-op
+        img.draft('L', img.size)
+        if img.mode != 'L':
+            img = img.convert('L')
     except Exception as e:
-        print(f"    XML parse error: {e}")
+        print(f"  Error opening {image_id}: {e}")
+        return None
+
+    # Decode the page once; line crops are slices of this array
+    page = np.asarray(img)
+
+    # Pad and clamp all line boxes at once; too small crops are dropped
+    boxes, keep = line_boxes(lines, img.width, img.height,
+                             padding=5, min_width=20, min_height=10)
+
+    # Extract lines
+    crops = []
+    for idx in np.flatnonzero(keep):
+        x1, y1, x2, y2 = boxes[idx].tolist()
+        text = lines[idx]['text']
+
+        try:
+            line_img = Image.fromarray(page[y1:y2, x1:x2])
+
+            buf = io.BytesIO()
+            line_img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+            crops.append((buf.getvalue(), text))
+
+        except:
+            pass
 
-    return lines
+    return crops
 
 
 def main():
@@ -74,12 +74,15 @@ def main():
     print("RASAM Line Extractor (Local)")
     print("="*50)
 
-    xml_files = list(REPO_DIR.glob("page/**/*.xml"))
+    xml_files = find_page_xml(REPO_DIR)
     print(f"Found {len(xml_files)} PAGE XML files")
 
-    # Check images
-    available_images = sum(1 for x in xml_files if (IMAGES_DIR / f"{x.stem}.jpg").exists())
+    # Check images (one directory listing, no per-page stat); only pages
+    # with an image are processed
+    image_stems = downloaded_image_stems(IMAGES_DIR)
+    available_images = sum(1 for x in xml_files if x.stem in image_stems)
     print(f"Available images: {available_images}/{len(xml_files)}\n")
+    xml_files = [x for x in xml_files if x.stem in image_stems]
 
     if available_images == 0:
         print("No images found! Run download_rasam_images.py first.")
@@ -88,64 +91,25 @@ def main():
     total_lines = 0
     total_pages = 0
 
-    for i, xml_path in enumerate(xml_files):
-        image_id = xml_path.stem
-        img_path = IMAGES_DIR / f"{image_id}.jpg"
-
-        if not img_path.exists():
-            continue
-
-        # Parse XML
-        lines = parse_page_xml(xml_path)
-        if not lines:
-            continue
-
-        # Open image
-        try:
-            img = Image.open(img_path)
-            if img.mode != 'L':
-                img = img.convert('L')
-        except Exception as e:
-            print(f"  Error opening {image_id}: {e}")
-            continue
-
-        # Extract lines
-        lines_saved = 0
-        for line_data in lines:
-            bbox = line_data['bbox']
-            text = line_data['text']
-
-            padding = 5
-            x1 = max(0, bbox[0] - padding)
-            y1 = max(0, bbox[1] - padding)
-            x2 = min(img.width, bbox[2] + padding)
-            y2 = min(img.height, bbox[3] + padding)
-
-            if x2 <= x1 or y2 <= y1:
-                continue
-
-            try:
-                line_img = img.crop((x1, y1, x2, y2))
-
-                if line_img.width < 20 or line_img.height < 10:
-                    continue
-
-                out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
-                out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
+    # Pages are cropped and encoded in parallel, one process per XML file
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(crop_page_lines, xml_files, chunksize=8)
 
-                line_img.save(out_png)
-                out_gt.write_text(text, encoding='utf-8')
+        for i, crops in enumerate(results):
+            if crops is not None:
+                for png_bytes, text in crops:
+                    out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
+                    out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
 
-                total_lines += 1
-                lines_saved += 1
+                    out_png.write_bytes(png_bytes)
+                    write_gt(out_gt, text)
 
-            except:
-                pass
+                    total_lines += 1
 
-        total_pages += 1
+                total_pages += 1
 
-        if (i + 1) % 50 == 0:
-            print(f"  Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines")
+            if (i + 1) % 50 == 0:
+                print(f"  Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines")
 
     print(f"\n{'='*50}")
     print(f"RASAM extraction complete!")
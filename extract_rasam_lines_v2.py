@@ -4,253 +4,175 @@ Reads reference image dimensions from PAGE XML and scales coordinates
 to match actual downloaded IIIF image dimensions.
 """
 
-import xml.etree.ElementTree as ET
-from pathlib import Path
+import io
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
-import re
+import numpy as np
+
+from page_common import (BASE_DIR, REPO_DIR, IMAGES_DIR, PNG_COMPRESS_LEVEL,
+                         downloaded_image_stems, find_page_xml, parse_page_xml,
+                         write_gt)
 
-BASE_DIR = Path(__file__).parent
-REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
-IMAGES_DIR = BASE_DIR / "training_data_lines" / "rasam_images"
 OUTPUT_DIR = BASE_DIR / "training_data_lines" / "rasam_lines_v2"
 
 
-def parse_page_xml_with_dimensions(xml_path):
-    """Parse PAGE XML, extract lines and reference image dimensions."""
-    lines = []
-    ref_width = None
-    ref_height = None
+def scale_and_crop_line(page, points, scale_x, scale_y, padding=10):
+    """Scale coordinates and crop line from a (height, width) page array."""
+    # Scale all points in one operation, then take the bounding box
+    scaled_points = points * (scale_x, scale_y)
+    (min_x, min_y), (max_x, max_y) = scaled_points.min(axis=0), scaled_points.max(axis=0)
 
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        # Try different namespace versions
-        namespaces = [
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15'},
-        ]
-
-        # Also try without namespace (some XMLs might not use namespace prefix)
-        for ns in namespaces:
-            # Get Page element for image dimensions
-            page_elem = root.find('.//page:Page', ns)
-            if page_elem is not None:
-                ref_width = page_elem.get('imageWidth')
-                ref_height = page_elem.get('imageHeight')
-                if ref_width:
-                    ref_width = int(ref_width)
-                if ref_height:
-                    ref_height = int(ref_height)
-
-            for textline in root.findall('.//page:TextLine', ns):
-                coords_elem = textline.find('page:Coords', ns)
-                if coords_elem is None:
-                    continue
-
-                coords_str = coords_elem.get('points', '')
-                if not coords_str:
-                    continue
-
-                text_elem = textline.find('page:TextEquiv/page:Unicode', ns)
-                if text_elem is None or text_elem.text is None:
-                    continue
-
-                text = text_elem.text.strip()
-                if not text:
-                    continue
-
-                # Parse polygon coordinates
-                points = []
-                for point in coords_str.split():
-                    try:
-                        x, y = map(float, point.split(','))
-                        points.append((x, y))
-                    except:
-                        continue
-
-                if len(points) >= 3:  # Need at least 3 points for a polygon
-                    lines.append({'points': points, 'text': text})
-
-            if lines:
-                break
-
-        # Try without namespace if nothing found
-        if not lines:
-            page_elem = root.find('.//Page')
-            if page_elem is not None:
-                ref_width = page_elem.get('imageWidth')
-                ref_height = page_elem.get('imageHeight')
-                if ref_width:
-                    ref_width = int(ref_width)
-                if ref_height:
-                    ref_height = int(ref_height)
-
-            for textline in root.findall('.//TextLine'):
-                coords_elem = textline.find('Coords')
-                if coords_elem is None:
-                    continue
-
-                coords_str = coords_elem.get('points', '')
-                if not coords_str:
-                    continue
-
-                text_elem = textline.find('TextEquiv/Unicode')
-                if text_elem is None or text_elem.text is None:
-                    continue
-
-                text = text_elem.text.strip()
-                if not text:
-                    continue
-
-                points = []
-                for point in coords_str.split():
-                    try:
-                        x, y = map(float, point.split(','))
-                        points.append((x, y))
-                    except:
-                        continue
-
-                if len(points) >= 3:
-                    lines.append({'points': points, 'text': text})
+    x1 = max(0, int(min_x) - padding)
+    y1 = max(0, int(min_y) - padding)
+    height, width = page.shape[:2]
+    x2 = min(width, int(max_x) + padding)
+    y2 = min(height, int(max_y) + padding)
 
-    except Exception as e:
-        print(f"    XML parse error: {e}")
+    if x2 <= x1 or y2 <= y1:
+        return None
 
-    return lines, ref_width, ref_height
+    return Image.fromarray(page[y1:y2, x1:x2])
 
 
-def scale_and_crop_line(img, points, scale_x, scale_y, padding=10):
-    """Scale coordinates and crop line from image."""
-    # Scale all points
-    scaled_points = [(p[0] * scale_x, p[1] * scale_y) for p in points]
+def crop_page_lines(xml_path):
+    """
+    Scale, crop and PNG-encode the text lines of one page.
 
-    # Get bounding box
-    xs = [p[0] for p in scaled_points]
-    ys = [p[1] for p in scaled_points]
+    Runs in a worker process. Returns (crops, counts): crops is a list of
+    (png_bytes, text) in page order, counts a Counter of 'pages' processed
+    and lines skipped for 'scaling', 'size' or 'text'. Files are written by
+    the parent so output numbering stays sequential.
+    """
+    crops = []
+    counts = Counter()
 
-    x1 = max(0, int(min(xs)) - padding)
-    y1 = max(0, int(min(ys)) - padding)
-    x2 = min(img.width, int(max(xs)) + padding)
-    y2 = min(img.height, int(max(ys)) + padding)
+    image_id = xml_path.stem
+    img_path = IMAGES_DIR / f"{image_id}.jpg"
 
-    if x2 <= x1 or y2 <= y1:
-        return None
+    # Parse XML with dimensions
+    lines, ref_width, ref_height = parse_page_xml(xml_path)
 
-    return img.crop((x1, y1, x2, y2))
+    if not lines:
+        return crops, counts
 
+    # Open image
+    try:
+        img = Image.open(img_path)
+    except Exception as e:
+        print(f"  Error opening {image_id}: {e}")
+        return crops, counts
 
-def main():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    if not (ref_width and ref_height):
+        # If no reference dimensions, skip this file
+        print(f"  Warning: No reference dimensions in {image_id}, skipping")
+        counts['scaling'] += 1
+        return crops, counts
 
-    print("RASAM Line Extractor v2 (with coordinate scaling)")
-    print("=" * 60)
+    # Let libjpeg decode in grayscale, and at a reduced DCT scale when the
+    # download is larger than the reference page; never below the reference
+    img.draft('L', (ref_width, ref_height))
 
-    xml_files = sorted(REPO_DIR.glob("page/**/*.xml"))
-    print(f"Found {len(xml_files)} PAGE XML files")
+    # Calculate scale factors (from the size actually decoded)
+    scale_x = img.width / ref_width
+    scale_y = img.height / ref_height
 
-    # Check images
-    available_images = sum(1 for x in xml_files if (IMAGES_DIR / f"{x.stem}.jpg").exists())
-    print(f"Available images: {available_images}/{len(xml_files)}\n")
+    # Convert to grayscale
+    if img.mode != 'L':
+        img = img.convert('L')
 
-    if available_images == 0:
-        print("No images found! Run download_rasam_images.py first.")
-        return
+    # Decode the page once; line crops are slices of this array
+    page = np.asarray(img)
 
-    total_lines = 0
-    total_pages = 0
-    skipped_scaling = 0
-    skipped_size = 0
-    skipped_text = 0
-
-    for i, xml_path in enumerate(xml_files):
-        image_id = xml_path.stem
-        img_path = IMAGES_DIR / f"{image_id}.jpg"
+    # Extract lines
+    for line_data in lines:
+        points = line_data['points']
+        text = line_data['text']
 
-        if not img_path.exists():
+        if len(points) < 3:  # Need at least 3 points for a polygon
             continue
 
-        # Parse XML with dimensions
-        lines, ref_width, ref_height = parse_page_xml_with_dimensions(xml_path)
-
-        if not lines:
+        # Skip very short text (likely noise)
+        if len(text) < 2:
+            counts['text'] += 1
             continue
 
-        # Open image
         try:
-            img = Image.open(img_path)
-        except Exception as e:
-            print(f"  Error opening {image_id}: {e}")
-            continue
+            line_img = scale_and_crop_line(page, points, scale_x, scale_y, padding=8)
 
-        # Calculate scale factors
-        if ref_width and ref_height:
-            scale_x = img.width / ref_width
-            scale_y = img.height / ref_height
-        else:
-            # If no reference dimensions, skip this file
-            print(f"  Warning: No reference dimensions in {image_id}, skipping")
-            skipped_scaling += 1
-            continue
+            if line_img is None:
+                continue
+
+            # Skip very small images
+            if line_img.width < 30 or line_img.height < 15:
+                counts['size'] += 1
+                continue
 
-        # Convert to grayscale
-        if img.mode != 'L':
-            img_gray = img.convert('L')
-        else:
-            img_gray = img
-
-        # Extract lines
-        lines_saved = 0
-        for line_data in lines:
-            points = line_data['points']
-            text = line_data['text']
-
-            # Skip very short text (likely noise)
-            if len(text) < 2:
-                skipped_text += 1
+            # Skip images that are too tall (likely multiple lines or errors)
+            if line_img.height > line_img.width * 0.8:
+                counts['size'] += 1
                 continue
 
-            try:
-                line_img = scale_and_crop_line(img_gray, points, scale_x, scale_y, padding=8)
+            buf = io.BytesIO()
+            line_img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+            crops.append((buf.getvalue(), text))
+
+        except Exception as e:
+            pass
+
+    counts['pages'] += 1
+    return crops, counts
 
-                if line_img is None:
-                    continue
 
-                # Skip very small images
-                if line_img.width < 30 or line_img.height < 15:
-                    skipped_size += 1
-                    continue
+def main():
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-                # Skip images that are too tall (likely multiple lines or errors)
-                if line_img.height > line_img.width * 0.8:
-                    skipped_size += 1
-                    continue
+    print("RASAM Line Extractor v2 (with coordinate scaling)")
+    print("=" * 60)
 
+    xml_files = find_page_xml(REPO_DIR)
+    print(f"Found {len(xml_files)} PAGE XML files")
+
+    # Check images (one directory listing, no per-page stat); only pages
+    # with an image are processed
+    image_stems = downloaded_image_stems(IMAGES_DIR)
+    available_images = sum(1 for x in xml_files if x.stem in image_stems)
+    print(f"Available images: {available_images}/{len(xml_files)}\n")
+    xml_files = [x for x in xml_files if x.stem in image_stems]
+
+    if available_images == 0:
+        print("No images found! Run download_rasam_images.py first.")
+        return
+
+    total_lines = 0
+    counts = Counter()
+
+    # Pages are cropped and encoded in parallel, one process per XML file
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(crop_page_lines, xml_files, chunksize=8)
+
+        for i, (crops, page_counts) in enumerate(results):
+            for png_bytes, text in crops:
                 out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
                 out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
 
-                line_img.save(out_png)
-                out_gt.write_text(text, encoding='utf-8')
+                out_png.write_bytes(png_bytes)
+                write_gt(out_gt, text)
 
                 total_lines += 1
-                lines_saved += 1
-
-            except Exception as e:
-                pass
 
-        total_pages += 1
+            counts.update(page_counts)
 
-        if (i + 1) % 50 == 0:
-            print(f"  Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines")
+            if (i + 1) % 50 == 0:
+                print(f"  Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines")
 
     print(f"\n{'=' * 60}")
     print(f"RASAM extraction v2 complete!")
-    print(f"  Pages processed: {total_pages}")
+    print(f"  Pages processed: {counts['pages']}")
     print(f"  Lines extracted: {total_lines}")
-    print(f"  Skipped (no scaling info): {skipped_scaling}")
-    print(f"  Skipped (too small/tall): {skipped_size}")
-    print(f"  Skipped (short text): {skipped_text}")
+    print(f"  Skipped (no scaling info): {counts['scaling']}")
+    print(f"  Skipped (too small/tall): {counts['size']}")
+    print(f"  Skipped (short text): {counts['text']}")
     print(f"  Output: {OUTPUT_DIR}")
 
 
@@ -3,9 +3,17 @@ Extract line images from RASAM dataset using BASELINE for precise cropping.
 The Baseline element gives exact text position - we crop a fixed height above/below it.
 """
 
-import xml.etree.ElementTree as ET
+import io
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from PIL import Image
+from lxml import etree
+import numpy as np
+
+from page_common import (PNG_COMPRESS_LEVEL, downloaded_image_stems, find_page_xml,
+                         parse_page_xml, parse_points, write_gt)
 
 BASE_DIR = Path(__file__).parent
 REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
@@ -18,116 +26,94 @@ ASCENDER_HEIGHT = 18  # pixels above baseline
 DESCENDER_HEIGHT = 12  # pixels below baseline
 
 
-def parse_page_xml_with_baselines(xml_path):
-    """Parse PAGE XML, extract lines using Baseline for precise positioning."""
-    lines = []
-    ref_width = None
-    ref_height = None
+@lru_cache(maxsize=None)
+def baseline_xpaths(ns_uri):
+    """
+    String XPaths for a TextLine's Baseline points, Coords points and Unicode
+    text ('' when missing); page_common.page_xpaths has no Baseline.
+    """
+    if ns_uri is None:
+        return (
+            etree.XPath('string(Baseline/@points)'),
+            etree.XPath('string(Coords/@points)'),
+            etree.XPath('string(TextEquiv/Unicode)'),
+        )
+    ns = {'page': ns_uri}
+    return (
+        etree.XPath('string(page:Baseline/@points)', namespaces=ns),
+        etree.XPath('string(page:Coords/@points)', namespaces=ns),
+        etree.XPath('string(page:TextEquiv/page:Unicode)', namespaces=ns),
+    )
+
+
+def read_textline(textline, baseline_str, coords_str, unicode_str):
+    """Return {'x_min', 'x_max', 'baseline_y', 'text'} for a TextLine, or None."""
+    # Get baseline - this is the key for precise positioning
+    baseline_pts = baseline_str(textline)
+    coords_pts = coords_str(textline)
+
+    if not baseline_pts and not coords_pts:
+        return None
 
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        namespaces = [
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'},
-            {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15'},
-        ]
-
-        for ns in namespaces:
-            page_elem = root.find('.//page:Page', ns)
-            if page_elem is not None:
-                ref_width = page_elem.get('imageWidth')
-                ref_height = page_elem.get('imageHeight')
-                if ref_width:
-                    ref_width = int(ref_width)
-                if ref_height:
-                    ref_height = int(ref_height)
-
-            for textline in root.findall('.//page:TextLine', ns):
-                # Get baseline - this is the key for precise positioning
-                baseline_elem = textline.find('page:Baseline', ns)
-                coords_elem = textline.find('page:Coords', ns)
-
-                if baseline_elem is None and coords_elem is None:
-                    continue
-
-                text_elem = textline.find('page:TextEquiv/page:Unicode', ns)
-                if text_elem is None or text_elem.text is None:
-                    continue
-
-                text = text_elem.text.strip()
-                if not text or len(text) < 2:
-                    continue
-
-                # Parse baseline points
-                baseline_points = []
-                if baseline_elem is not None:
-                    baseline_str = baseline_elem.get('points', '')
-                    for point in baseline_str.split():
-                        try:
-                            x, y = map(float, point.split(','))
-                            baseline_points.append((x, y))
-                        except:
-                            continue
-
-                # Parse coords for x-range (horizontal extent)
-                coord_points = []
-                if coords_elem is not None:
-                    coords_str = coords_elem.get('points', '')
-                    for point in coords_str.split():
-                        try:
-                            x, y = map(float, point.split(','))
-                            coord_points.append((x, y))
-                        except:
-                            continue
-
-                if baseline_points:
-                    # Use baseline for y positioning
-                    baseline_y = sum(p[1] for p in baseline_points) / len(baseline_points)
-                    x_min = min(p[0] for p in baseline_points)
-                    x_max = max(p[0] for p in baseline_points)
-
-                    # Extend x-range from coords if available
-                    if coord_points:
-                        x_min = min(x_min, min(p[0] for p in coord_points))
-                        x_max = max(x_max, max(p[0] for p in coord_points))
-
-                    lines.append({
-                        'x_min': x_min,
-                        'x_max': x_max,
-                        'baseline_y': baseline_y,
-                        'text': text
-                    })
-                elif coord_points:
-                    # Fallback: use middle of coord polygon
-                    xs = [p[0] for p in coord_points]
-                    ys = [p[1] for p in coord_points]
-                    # Estimate baseline as 60% down from top (typical for Arabic)
-                    y_min, y_max = min(ys), max(ys)
-                    baseline_y = y_min + (y_max - y_min) * 0.6
-
-                    lines.append({
-                        'x_min': min(xs),
-                        'x_max': max(xs),
-                        'baseline_y': baseline_y,
-                        'text': text
-                    })
-
-            if lines:
-                break
-
-    except ET.ParseError as e:
-        pass  # Skip malformed XML
-    except Exception as e:
-        print(f"    Error: {e}")
+    text = unicode_str(textline).strip()
+    if not text or len(text) < 2:
+        return None
+
+    # Parse baseline points, (N, 2) arrays
+    baseline_points = None
+    if baseline_pts:
+        baseline_points = parse_points(baseline_pts)
+
+    # Parse coords for x-range (horizontal extent)
+    coord_points = None
+    if coords_pts:
+        coord_points = parse_points(coords_pts)
+
+    if baseline_points is not None:
+        # Use baseline for y positioning
+        baseline_y = baseline_points[:, 1].mean()
+        x_min = baseline_points[:, 0].min()
+        x_max = baseline_points[:, 0].max()
+
+        # Extend x-range from coords if available
+        if coord_points is not None:
+            x_min = min(x_min, coord_points[:, 0].min())
+            x_max = max(x_max, coord_points[:, 0].max())
+
+        return {
+            'x_min': x_min,
+            'x_max': x_max,
+            'baseline_y': baseline_y,
+            'text': text
+        }
+
+    if coord_points is not None:
+        # Fallback: use middle of coord polygon
+        (x_min, y_min), (x_max, y_max) = coord_points.min(axis=0), coord_points.max(axis=0)
+        # Estimate baseline as 60% down from top (typical for Arabic)
+        baseline_y = y_min + (y_max - y_min) * 0.6
+
+        return {
+            'x_min': x_min,
+            'x_max': x_max,
+            'baseline_y': baseline_y,
+            'text': text
+        }
+
+    return None
 
-    return lines, ref_width, ref_height
 
+def parse_page_xml_with_baselines(xml_path):
+    """Parse PAGE XML, extract lines using Baseline for precise positioning."""
+    return parse_page_xml(xml_path, read_line=read_textline, xpaths=baseline_xpaths)
 
-def crop_line_from_baseline(img, x_min, x_max, baseline_y, scale_x, scale_y,
-                            ascender_px=ASCENDER_HEIGHT, descender_px=DESCENDER_HEIGHT):
-    """Crop line using baseline position with fixed heights above/below."""
+
+def line_box_from_baseline(width, height, x_min, x_max, baseline_y, scale_x, scale_y,
+                           ascender_px=ASCENDER_HEIGHT, descender_px=DESCENDER_HEIGHT):
+    """
+    Crop box (x1, y1, x2, y2) for a line in a width x height page, using
+    baseline position with fixed heights above/below. None if empty.
+    """
     # Scale coordinates
     x1 = int(x_min * scale_x)
     x2 = int(x_max * scale_x)
@@ -144,14 +130,95 @@ def crop_line_from_baseline(img, x_min, x_max, baseline_y, scale_x, scale_y,
     # Add small horizontal padding
     padding_x = 5
     x1 = max(0, x1 - padding_x)
-    x2 = min(img.width, x2 + padding_x)
+    x2 = min(width, x2 + padding_x)
     y1 = max(0, y1)
-    y2 = min(img.height, y2)
+    y2 = min(height, y2)
 
     if x2 <= x1 or y2 <= y1:
         return None
 
-    return img.crop((x1, y1, x2, y2))
+    return x1, y1, x2, y2
+
+
+def crop_page_lines(xml_path):
+    """
+    Crop and PNG-encode the text lines of one page.
+
+    Runs in a worker process. Returns (crops, counts): crops is a list of
+    (png_bytes, text) in page order, counts a Counter of 'pages' processed,
+    pages skipped for 'nodim' and lines skipped for 'size'. Files are
+    written by the parent so output numbering stays sequential.
+    """
+    crops = []
+    counts = Counter()
+
+    image_id = xml_path.stem
+    img_path = IMAGES_DIR / f"{image_id}.jpg"
+
+    lines, ref_width, ref_height = parse_page_xml_with_baselines(xml_path)
+
+    if not lines:
+        return crops, counts
+
+    try:
+        img = Image.open(img_path)
+    except Exception as e:
+        return crops, counts
+
+    if not ref_width or not ref_height:
+        counts['nodim'] += 1
+        return crops, counts
+
+    # Let libjpeg decode in grayscale, and at a reduced DCT scale when the
+    # download is larger than the reference page; never below the reference
+    img.draft('L', (ref_width, ref_height))
+
+    # Scale factors from the size actually decoded
+    scale_x = img.width / ref_width
+    scale_y = img.height / ref_height
+
+    if img.mode != 'L':
+        img = img.convert('L')
+
+    # Decode the page once; line crops are slices of this array
+    page = np.asarray(img)
+
+    for line_data in lines:
+        try:
+            box = line_box_from_baseline(
+                img.width, img.height,
+                line_data['x_min'],
+                line_data['x_max'],
+                line_data['baseline_y'],
+                scale_x, scale_y
+            )
+
+            if box is None:
+                continue
+
+            # Quality checks, on the box before anything is cropped
+            x1, y1, x2, y2 = box
+            if x2 - x1 < 50 or y2 - y1 < 20:
+                counts['size'] += 1
+                continue
+
+            # Skip if aspect ratio is wrong (too square or too tall)
+            aspect = (x2 - x1) / (y2 - y1)
+            if aspect < 3:  # Lines should be much wider than tall
+                counts['size'] += 1
+                continue
+
+            line_img = Image.fromarray(page[y1:y2, x1:x2])
+
+            buf = io.BytesIO()
+            line_img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+            crops.append((buf.getvalue(), line_data['text']))
+
+        except Exception as e:
+            pass
+
+    counts['pages'] += 1
+    return crops, counts
 
 
 def main():
@@ -162,98 +229,48 @@ def main():
     print(f"Ascender height: {ASCENDER_HEIGHT}px, Descender: {DESCENDER_HEIGHT}px")
     print()
 
-    xml_files = sorted(REPO_DIR.glob("page/**/*.xml"))
+    xml_files = find_page_xml(REPO_DIR)
     print(f"Found {len(xml_files)} PAGE XML files")
 
-    available_images = sum(1 for x in xml_files if (IMAGES_DIR / f"{x.stem}.jpg").exists())
+    # Check images (one directory listing, no per-page stat); only pages
+    # with an image are processed
+    image_stems = downloaded_image_stems(IMAGES_DIR)
+    available_images = sum(1 for x in xml_files if x.stem in image_stems)
     print(f"Available images: {available_images}/{len(xml_files)}\n")
+    xml_files = [x for x in xml_files if x.stem in image_stems]
 
     if available_images == 0:
         print("No images found! Run download_rasam_images.py first.")
         return
 
     total_lines = 0
-    total_pages = 0
-    skipped_size = 0
-    skipped_nodim = 0
-
-    for i, xml_path in enumerate(xml_files):
-        image_id = xml_path.stem
-        img_path = IMAGES_DIR / f"{image_id}.jpg"
-
-        if not img_path.exists():
-            continue
-
-        lines, ref_width, ref_height = parse_page_xml_with_baselines(xml_path)
+    counts = Counter()
 
-        if not lines:
-            continue
-
-        try:
-            img = Image.open(img_path)
-        except Exception as e:
-            continue
-
-        if not ref_width or not ref_height:
-            skipped_nodim += 1
-            continue
-
-        scale_x = img.width / ref_width
-        scale_y = img.height / ref_height
-
-        if img.mode != 'L':
-            img_gray = img.convert('L')
-        else:
-            img_gray = img
-
-        lines_saved = 0
-        for line_data in lines:
-            try:
-                line_img = crop_line_from_baseline(
-                    img_gray,
-                    line_data['x_min'],
-                    line_data['x_max'],
-                    line_data['baseline_y'],
-                    scale_x, scale_y
-                )
-
-                if line_img is None:
-                    continue
-
-                # Quality checks
-                if line_img.width < 50 or line_img.height < 20:
-                    skipped_size += 1
-                    continue
-
-                # Skip if aspect ratio is wrong (too square or too tall)
-                aspect = line_img.width / line_img.height
-                if aspect < 3:  # Lines should be much wider than tall
-                    skipped_size += 1
-                    continue
+    # Pages are cropped and encoded in parallel, one process per XML file
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(crop_page_lines, xml_files, chunksize=8)
 
+        for i, (crops, page_counts) in enumerate(results):
+            for png_bytes, text in crops:
                 out_png = OUTPUT_DIR / f"rasam_{total_lines:05d}.png"
                 out_gt = OUTPUT_DIR / f"rasam_{total_lines:05d}.gt.txt"
 
-                line_img.save(out_png)
-                out_gt.write_text(line_data['text'], encoding='utf-8')
+                out_png.write_bytes(png_bytes)
+                write_gt(out_gt, text)
 
                 total_lines += 1
-                lines_saved += 1
-
-            except Exception as e:
-                pass
 
-        total_pages += 1
+            counts.update(page_counts)
 
-        if (i + 1) % 50 == 0:
-            print(f"  Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines")
+            if (i + 1) % 50 == 0:
+                print(f"  Progress: {i+1}/{len(xml_files)} pages, {total_lines} lines")
 
     print(f"\n{'=' * 60}")
     print(f"RASAM extraction v3 complete!")
-    print(f"  Pages processed: {total_pages}")
+    print(f"  Pages processed: {counts['pages']}")
     print(f"  Lines extracted: {total_lines}")
-    print(f"  Skipped (no dimensions): {skipped_nodim}")
-    print(f"  Skipped (size/aspect): {skipped_size}")
+    print(f"  Skipped (no dimensions): {counts['nodim']}")
+    print(f"  Skipped (size/aspect): {counts['size']}")
     print(f"  Output: {OUTPUT_DIR}")
 
 
@@ -3,11 +3,17 @@ Extract line images from RASM 2019 PAGE XML format for Kraken training.
 Converts TIFF + PAGE XML to PNG line images + .gt.txt files.
 """
 
-import xml.etree.ElementTree as ET
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image
+from lxml import etree
+import numpy as np
 import re
 
+from page_common import PNG_COMPRESS_LEVEL, write_gt
+
 # Paths
 BASE_DIR = Path(__file__).parent
 RASM_DIRS = [
@@ -19,20 +25,28 @@ OUTPUT_DIR = BASE_DIR / "training_data_lines" / "rasm_lines"
 # PAGE XML namespace
 NS = {'page': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15'}
 
+# Compiled once; RASM only uses the 2013 namespace. The string() XPaths
+# return '' when the element is missing
+FIND_TEXTLINES = etree.XPath('//page:TextLine', namespaces=NS)
+COORDS_POINTS = etree.XPath('string(page:Coords/@points)', namespaces=NS)
+UNICODE_TEXT = etree.XPath('string(page:TextEquiv/page:Unicode)', namespaces=NS)
+
 
 def parse_coords(coords_str):
     """Parse polygon coordinates and return bounding box (x1, y1, x2, y2)."""
-    points = []
-    for point in coords_str.split():
-        x, y = map(int, point.split(','))
-        points.append((x, y))
-
-    if not points:
+    # All "x,y x,y ..." values converted in one call, as an (N, 2) array; a
+    # malformed value raises on any numpy version and only this line is skipped
+    try:
+        points = np.array(coords_str.replace(',', ' ').split(), dtype=np.int64)
+    except ValueError:
+        return None
+    if points.size < 2 or points.size % 2:
         return None
+    points = points.reshape(-1, 2)
 
-    xs = [p[0] for p in points]
-    ys = [p[1] for p in points]
-    return (min(xs), min(ys), max(xs), max(ys))
+    x1, y1 = points.min(axis=0)
+    x2, y2 = points.max(axis=0)
+    return (int(x1), int(y1), int(x2), int(y2))
 
 
 def extract_lines_from_page(xml_path, tiff_path):
@@ -40,17 +54,13 @@ def extract_lines_from_page(xml_path, tiff_path):
     lines = []
 
     try:
-        tree = ET.parse(xml_path)
+        tree = etree.parse(str(xml_path))
         root = tree.getroot()
 
         # Find all TextLine elements
-        for textline in root.findall('.//page:TextLine', NS):
+        for textline in FIND_TEXTLINES(root):
             # Get coordinates
-            coords_elem = textline.find('page:Coords', NS)
-            if coords_elem is None:
-                continue
-
-            coords_str = coords_elem.get('points', '')
+            coords_str = COORDS_POINTS(textline)
             if not coords_str:
                 continue
 
@@ -59,11 +69,7 @@ def extract_lines_from_page(xml_path, tiff_path):
                 continue
 
             # Get text content
-            text_equiv = textline.find('page:TextEquiv/page:Unicode', NS)
-            if text_equiv is None or text_equiv.text is None:
-                continue
-
-            text = text_equiv.text.strip()
+            text = UNICODE_TEXT(textline).strip()
             if not text:
                 continue
 
@@ -78,6 +84,67 @@ def extract_lines_from_page(xml_path, tiff_path):
     return lines
 
 
+def crop_page_lines(xml_path):
+    """
+    Crop and PNG-encode the text lines of one page.
+
+    Runs in a worker process. Returns a list of (png_bytes, text) in page
+    order, or None if the page was skipped. Files are written by the parent
+    so output numbering stays sequential.
+    """
+    # Corresponding TIFF (main only passes pages that have one)
+    tiff_path = xml_path.with_suffix('.tif')
+
+    # Extract lines from XML
+    lines = extract_lines_from_page(xml_path, tiff_path)
+    if not lines:
+        return None
+
+    # Open TIFF image
+    try:
+        img = Image.open(tiff_path)
+        # Convert to grayscale
+        if img.mode != 'L':
+            img = img.convert('L')
+    except Exception as e:
+        print(f"  Error opening {tiff_path.name}: {e}")
+        return None
+
+    # Decode the page once; line crops are slices of this array
+    page = np.asarray(img)
+
+    # Extract each line
+    crops = []
+    for line_data in lines:
+        bbox = line_data['bbox']
+        text = line_data['text']
+
+        # Add padding
+        padding = 5
+        x1 = max(0, bbox[0] - padding)
+        y1 = max(0, bbox[1] - padding)
+        x2 = min(img.width, bbox[2] + padding)
+        y2 = min(img.height, bbox[3] + padding)
+
+        # Crop line
+        try:
+            # Skip very small images
+            if x2 - x1 < 20 or y2 - y1 < 10:
+                continue
+
+            line_img = Image.fromarray(page[y1:y2, x1:x2])
+
+            buf = io.BytesIO()
+            line_img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+            crops.append((buf.getvalue(), text))
+
+        except Exception as e:
+            print(f"  Error cropping line: {e}")
+            continue
+
+    return crops
+
+
 def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -91,69 +158,40 @@ def main():
 
         print(f"\nProcessing: {rasm_dir.name}")
 
-        # Find all XML files
-        xml_files = list(rasm_dir.glob("*.xml"))
+        # Find all XML files and TIFFs (one directory listing)
+        with os.scandir(rasm_dir) as it:
+            names = {entry.name for entry in it}
+        xml_files = sorted(rasm_dir / name for name in names if name.endswith('.xml'))
         print(f"  Found {len(xml_files)} XML files")
 
+        # Find corresponding TIFF
         for xml_path in xml_files:
-            # Find corresponding TIFF
-            tiff_path = xml_path.with_suffix('.tif')
-            if not tiff_path.exists():
+            if f"{xml_path.stem}.tif" not in names:
                 print(f"  TIFF not found for {xml_path.name}")
-                continue
+        xml_files = [x for x in xml_files if f"{x.stem}.tif" in names]
 
-            # Extract lines from XML
-            lines = extract_lines_from_page(xml_path, tiff_path)
-            if not lines:
-                continue
+        # Pages are cropped and encoded in parallel, one process per XML file
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(crop_page_lines, xml_files, chunksize=8)
 
-            # Open TIFF image
-            try:
-                img = Image.open(tiff_path)
-                # Convert to grayscale
-                if img.mode != 'L':
-                    img = img.convert('L')
-            except Exception as e:
-                print(f"  Error opening {tiff_path.name}: {e}")
-                continue
-
-            # Extract each line
-            for line_data in lines:
-                bbox = line_data['bbox']
-                text = line_data['text']
-
-                # Add padding
-                padding = 5
-                x1 = max(0, bbox[0] - padding)
-                y1 = max(0, bbox[1] - padding)
-                x2 = min(img.width, bbox[2] + padding)
-                y2 = min(img.height, bbox[3] + padding)
-
-                # Crop line
-                try:
-                    line_img = img.crop((x1, y1, x2, y2))
-
-                    # Skip very small images
-                    if line_img.width < 20 or line_img.height < 10:
-                        continue
+            for crops in results:
+                if crops is None:
+                    continue
 
+                for png_bytes, text in crops:
                     # Save
                     out_png = OUTPUT_DIR / f"rasm_{total_lines:05d}.png"
                     out_gt = OUTPUT_DIR / f"rasm_{total_lines:05d}.gt.txt"
 
-                    line_img.save(out_png)
-                    out_gt.write_text(text, encoding='utf-8')
+                    out_png.write_bytes(png_bytes)
+                    write_gt(out_gt, text)
 
                     total_lines += 1
 
-                except Exception as e:
-                    print(f"  Error cropping line: {e}")
-                    continue
-
-            total_pages += 1
+                total_pages += 1
 
-            if total_pages % 10 == 0:
-                print(f"  Processed {total_pages} pages, {total_lines} lines...")
+                if total_pages % 10 == 0:
+                    print(f"  Processed {total_pages} pages, {total_lines} lines...")
 
     print(f"\n{'='*50}")
     print(f"RASM extraction complete!")
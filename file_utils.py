@@ -0,0 +1,33 @@
+"""
+Shared file helpers for the dataset filtering scripts.
+"""
+
+import errno
+import os
+import shutil
+
+
+def link_or_copy(src, dst):
+    """
+    Hardlink src to dst; copy instead when dst is on another filesystem.
+
+    Linking moves no data, but needs dst on the same filesystem as src.
+    Linked files share their contents with the source, so an existing dst
+    is removed first rather than written through (a stale link would
+    otherwise rewrite its old source). Other errors, such as permissions
+    or a full disk, are raised.
+    """
+    try:
+        if os.path.samefile(src, dst):
+            # Re-run: already linked
+            return
+        os.unlink(dst)
+    except FileNotFoundError:
+        pass
+
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(src, dst)
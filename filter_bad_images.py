@@ -4,22 +4,34 @@ Filter out images that cause dewarping errors in Kraken training.
 
 import os
 import glob
-import shutil
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 import numpy as np
 
+from file_utils import link_or_copy
+
 # Try to import Kraken's lineest for testing
 try:
     from kraken.lib.lineest import CenterNormalizer
     HAS_KRAKEN = True
 except ImportError:
     HAS_KRAKEN = False
-    print("Warning: kraken not available, using basic checks only")
 
+# Output files are hardlinked from SOURCE_DIR when on the same filesystem
 SOURCE_DIR = "training_data_lines/public_line_images"
 OUTPUT_DIR = "training_data_lines/public_line_images_filtered"
 BAD_DIR = "training_data_lines/public_line_images_bad"
 
+# Set per worker process by init_worker
+_normalizer = None
+
+
+def init_worker():
+    """Create the worker's CenterNormalizer once instead of once per image."""
+    global _normalizer
+    if HAS_KRAKEN:
+        _normalizer = CenterNormalizer()
+
 
 def test_image_dewarp(img_path):
     """Test if an image can be processed by Kraken's dewarping."""
@@ -38,11 +50,12 @@ def test_image_dewarp(img_path):
 
         if HAS_KRAKEN:
             # Test with Kraken's normalizer
-            normalizer = CenterNormalizer()
+            if _normalizer is None:
+                init_worker()
             try:
                 # This is what fails in training
                 cval = np.amax(arr)
-                normalized = normalizer.normalize(arr, cval=cval)
+                normalized = _normalizer.normalize(arr, cval=cval)
                 return True, "ok"
             except ValueError as e:
                 return False, f"dewarp_error: {str(e)[:50]}"
@@ -66,6 +79,9 @@ def main():
     print("Filtering bad images from training data")
     print("=" * 60)
 
+    if not HAS_KRAKEN:
+        print("Warning: kraken not available, using basic checks only")
+
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     os.makedirs(BAD_DIR, exist_ok=True)
 
@@ -77,29 +93,32 @@ def main():
     bad_count = 0
     bad_reasons = {}
 
-    for i, img_path in enumerate(png_files):
-        if i % 1000 == 0:
-            print(f"Checking image {i}/{len(png_files)}... (good: {good_count}, bad: {bad_count})")
-
-        ok, reason = test_image_dewarp(img_path)
-
-        basename = os.path.basename(img_path)
-        gt_name = basename.replace('.png', '.gt.txt')
-        gt_path = os.path.join(SOURCE_DIR, gt_name)
-
-        if ok:
-            # Copy good files to filtered directory
-            shutil.copy2(img_path, os.path.join(OUTPUT_DIR, basename))
-            if os.path.exists(gt_path):
-                shutil.copy2(gt_path, os.path.join(OUTPUT_DIR, gt_name))
-            good_count += 1
-        else:
-            # Move bad files to bad directory
-            shutil.copy2(img_path, os.path.join(BAD_DIR, basename))
-            if os.path.exists(gt_path):
-                shutil.copy2(gt_path, os.path.join(BAD_DIR, gt_name))
-            bad_count += 1
-            bad_reasons[reason] = bad_reasons.get(reason, 0) + 1
+    # Images are checked in parallel; files are linked here as results
+    # arrive (in input order)
+    with ProcessPoolExecutor(initializer=init_worker) as executor:
+        results = executor.map(test_image_dewarp, png_files, chunksize=64)
+
+        for i, (img_path, (ok, reason)) in enumerate(zip(png_files, results)):
+            if i % 1000 == 0:
+                print(f"Checking image {i}/{len(png_files)}... (good: {good_count}, bad: {bad_count})")
+
+            basename = os.path.basename(img_path)
+            gt_name = basename.replace('.png', '.gt.txt')
+            gt_path = os.path.join(SOURCE_DIR, gt_name)
+
+            if ok:
+                # Link good files into filtered directory
+                link_or_copy(img_path, os.path.join(OUTPUT_DIR, basename))
+                if os.path.exists(gt_path):
+                    link_or_copy(gt_path, os.path.join(OUTPUT_DIR, gt_name))
+                good_count += 1
+            else:
+                # Link bad files into bad directory
+                link_or_copy(img_path, os.path.join(BAD_DIR, basename))
+                if os.path.exists(gt_path):
+                    link_or_copy(gt_path, os.path.join(BAD_DIR, gt_name))
+                bad_count += 1
+                bad_reasons[reason] = bad_reasons.get(reason, 0) + 1
 
     print()
     print("=" * 60)
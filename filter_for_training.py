@@ -6,14 +6,41 @@ This creates a new folder with only word/line samples for training.
 """
 
 import os
-import shutil
 from pathlib import Path
 
+from file_utils import link_or_copy
+
+# Output files are hardlinked from SOURCE_DIR when on the same filesystem
 SOURCE_DIR = Path(__file__).parent / "handwritten_training_data"
 OUTPUT_DIR = Path(__file__).parent / "training_data_words"
 MIN_CHARS = 2  # Minimum characters per sample
 
 
+def scan_pairs(directory):
+    """
+    List (gt_path, img_path, gt_size) for each .gt.txt with one os.scandir pass.
+
+    img_path is None when a .gt.txt file has no matching .png; gt_size is
+    the GT file size in bytes, from the directory entry.
+    """
+    gt_entries = []
+    png_names = set()
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith('.gt.txt'):
+                gt_entries.append((entry.name, entry.stat().st_size))
+            elif entry.name.endswith('.png'):
+                png_names.add(entry.name)
+
+    pairs = []
+    for gt_name, gt_size in gt_entries:
+        # "hw_000000.gt.txt" -> "hw_000000.png"
+        img_name = gt_name[:-len('.gt.txt')] + '.png'
+        img_path = directory / img_name if img_name in png_names else None
+        pairs.append((directory / gt_name, img_path, gt_size))
+    return pairs
+
+
 def main():
     print("Filtering training data for multi-character samples only...")
     print(f"Source: {SOURCE_DIR}")
@@ -23,8 +50,9 @@ def main():
 
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    gt_files = list(SOURCE_DIR.glob("*.gt.txt"))
-    total = len(gt_files)
+    # GT files with their images, from one directory listing
+    pairs = scan_pairs(SOURCE_DIR)
+    total = len(pairs)
     print(f"Found {total} ground truth files")
 
     copied = 0
@@ -32,10 +60,19 @@ def main():
     skipped_empty = 0
     char_counts = {}
 
-    for i, gt_path in enumerate(gt_files):
+    for i, (gt_path, img_path, gt_size) in enumerate(pairs):
         if i % 50000 == 0 and i > 0:
             print(f"  Processing: {i}/{total} (copied: {copied})")
 
+        # Decide from the file size alone when it cannot hold MIN_CHARS
+        # characters (each takes at least one UTF-8 byte)
+        if gt_size == 0:
+            skipped_empty += 1
+            continue
+        if gt_size < MIN_CHARS:
+            skipped_single += 1
+            continue
+
         try:
             text = gt_path.read_text(encoding='utf-8').strip()
             char_count = len(text)
@@ -51,13 +88,10 @@ def main():
             # Track character distribution
             char_counts[char_count] = char_counts.get(char_count, 0) + 1
 
-            # Copy files - handle .gt.txt -> .png correctly
-            # gt_path.stem gives "hw_000000.gt", we need "hw_000000.png"
-            img_name = gt_path.name.replace('.gt.txt', '.png')
-            img_path = gt_path.parent / img_name
-            if img_path.exists():
-                shutil.copy(gt_path, OUTPUT_DIR / gt_path.name)
-                shutil.copy(img_path, OUTPUT_DIR / img_path.name)
+            # Link files (the image was paired up by scan_pairs)
+            if img_path is not None:
+                link_or_copy(gt_path, OUTPUT_DIR / gt_path.name)
+                link_or_copy(img_path, OUTPUT_DIR / img_path.name)
                 copied += 1
 
         except Exception as e:
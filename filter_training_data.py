@@ -13,52 +13,78 @@ BACKUP_DIR = Path(__file__).parent / "handwritten_training_data_backup"
 MAX_SINGLE_CHAR = 10000
 MAX_MULTI_CHAR = 20000
 
-def move_files_to_backup(files_to_remove, description):
-    """Move file pairs to backup directory"""
+def sample_split(files, keep_count):
+    """
+    Randomly keep keep_count of files; returns (kept, removed) in scan order.
+
+    Draws only keep_count indices instead of shuffling the whole list.
+    """
+    keep = set(random.sample(range(len(files)), keep_count))
+    kept = [f for i, f in enumerate(files) if i in keep]
+    removed = [f for i, f in enumerate(files) if i not in keep]
+    return kept, removed
+
+def move_files_to_backup(files_to_remove, png_names, description):
+    """Move .gt.txt files and their .png images to backup directory"""
     if not files_to_remove:
         return
 
     BACKUP_DIR.mkdir(parents=True, exist_ok=True)
     print(f"\nMoving {len(files_to_remove)} {description} pairs to backup...")
 
-    for i, gt_path in enumerate(files_to_remove):
+    for i, gt_name in enumerate(files_to_remove):
         if i % 5000 == 0:
             print(f"  Moving: {i}/{len(files_to_remove)}")
 
         # Move .gt.txt file
-        shutil.move(str(gt_path), str(BACKUP_DIR / gt_path.name))
+        shutil.move(str(TRAINING_DIR / gt_name), str(BACKUP_DIR / gt_name))
 
-        # Move corresponding image file
-        img_path = gt_path.with_suffix('.png')
-        if img_path.exists():
-            shutil.move(str(img_path), str(BACKUP_DIR / img_path.name))
+        # Move corresponding image file ("hw_000000.gt.txt" -> "hw_000000.png")
+        img_name = gt_name[:-len('.gt.txt')] + '.png'
+        if img_name in png_names:
+            shutil.move(str(TRAINING_DIR / img_name), str(BACKUP_DIR / img_name))
 
 def main():
     print("Scanning training data...")
 
+    # GT file names by character count, and all image names
     single_char_files = []
     multi_char_files = []
-
-    gt_files = list(TRAINING_DIR.glob("*.gt.txt"))
-    total = len(gt_files)
+    png_names = set()
+    total = 0
+
+    # One streaming pass over the directory: GT files are classified as
+    # they are listed, nothing else is kept per file
+    with os.scandir(TRAINING_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.png'):
+                png_names.add(entry.name)
+                continue
+            if not entry.name.endswith('.gt.txt'):
+                continue
+
+            if total % 10000 == 0:
+                print(f"  Scanning: {total}")
+            total += 1
+
+            # An empty file has no characters; no need to open it
+            if entry.stat().st_size == 0:
+                continue
+
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    text = f.read().strip()
+                char_count = len(text)
+
+                if char_count == 1:
+                    single_char_files.append(entry.name)
+                elif char_count > 1:
+                    multi_char_files.append(entry.name)
+            except Exception as e:
+                print(f"  Error reading {entry.name}: {e}")
 
     print(f"Found {total} ground truth files")
 
-    for i, gt_path in enumerate(gt_files):
-        if i % 10000 == 0:
-            print(f"  Scanning: {i}/{total}")
-
-        try:
-            text = gt_path.read_text(encoding='utf-8').strip()
-            char_count = len(text)
-
-            if char_count == 1:
-                single_char_files.append(gt_path)
-            elif char_count > 1:
-                multi_char_files.append(gt_path)
-        except Exception as e:
-            print(f"  Error reading {gt_path.name}: {e}")
-
     print(f"\nResults:")
     print(f"  Single character samples: {len(single_char_files)}")
     print(f"  Multi-character samples: {len(multi_char_files)}")
@@ -67,19 +93,15 @@ def main():
 
     # Filter single-char files
     if len(single_char_files) > MAX_SINGLE_CHAR:
-        random.shuffle(single_char_files)
-        files_to_remove = single_char_files[MAX_SINGLE_CHAR:]
+        single_char_files, files_to_remove = sample_split(single_char_files, MAX_SINGLE_CHAR)
         print(f"\nWill keep {MAX_SINGLE_CHAR} single-char, remove {len(files_to_remove)}")
-        move_files_to_backup(files_to_remove, "single-char")
-        single_char_files = single_char_files[:MAX_SINGLE_CHAR]
+        move_files_to_backup(files_to_remove, png_names, "single-char")
 
     # Filter multi-char files
     if len(multi_char_files) > MAX_MULTI_CHAR:
-        random.shuffle(multi_char_files)
-        files_to_remove = multi_char_files[MAX_MULTI_CHAR:]
+        multi_char_files, files_to_remove = sample_split(multi_char_files, MAX_MULTI_CHAR)
         print(f"\nWill keep {MAX_MULTI_CHAR} multi-char, remove {len(files_to_remove)}")
-        move_files_to_backup(files_to_remove, "multi-char")
-        multi_char_files = multi_char_files[:MAX_MULTI_CHAR]
+        move_files_to_backup(files_to_remove, png_names, "multi-char")
 
     # Final count
     remaining_gt = len(list(TRAINING_DIR.glob("*.gt.txt")))
@@ -1,46 +1,55 @@
 """
 Find and optionally remove images that cause dewarping errors in Kraken.
 """
-import os
 import sys
 import numpy as np
 from pathlib import Path
 from PIL import Image
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 
 def check_image(img_path):
     """Check if an image will cause dewarping issues."""
     try:
+        # Size checks only need the header; pixels are decoded once, below,
+        # by getextrema() without building a NumPy array
         img = Image.open(img_path)
-        arr = np.array(img)
+        width, height = img.size
 
         # Check for problematic conditions
         issues = []
 
         # 1. Check if image is too small
-        if arr.shape[0] < 10 or arr.shape[1] < 10:
-            issues.append(f"Too small: {arr.shape}")
+        if height < 10 or width < 10:
+            issues.append(f"Too small: {(height, width)}")
 
         # 2. Check if image is completely blank (all same value)
-        if arr.min() == arr.max():
+        extrema = img.getextrema()
+        if isinstance(extrema[0], tuple):
+            # One (min, max) pair per band
+            lo = min(band[0] for band in extrema)
+            hi = max(band[1] for band in extrema)
+        else:
+            lo, hi = extrema
+        if lo == hi:
             issues.append("Blank image (uniform color)")
 
         # 3. Check for very thin images (height < 5)
-        if arr.shape[0] < 5:
-            issues.append(f"Too thin: height={arr.shape[0]}")
+        if height < 5:
+            issues.append(f"Too thin: height={height}")
 
         # 4. Check for extremely wide aspect ratio
-        if arr.shape[1] > arr.shape[0] * 100:
-            issues.append(f"Extreme aspect ratio: {arr.shape[1]/arr.shape[0]:.0f}:1")
+        if width > height * 100:
+            issues.append(f"Extreme aspect ratio: {width/height:.0f}:1")
 
         # 5. Check if grayscale or RGB
-        if len(arr.shape) == 3 and arr.shape[2] == 4:
+        if img.mode == 'RGBA':
             # RGBA - check for fully transparent
-            if arr[:,:,3].max() == 0:
+            if extrema[3][1] == 0:
                 issues.append("Fully transparent image")
 
-        # 6. Check for NaN or Inf values (corrupted)
-        if np.isnan(arr).any() or np.isinf(arr).any():
+        # 6. Check for NaN or Inf values (corrupted); only float images
+        # can hold them
+        if img.mode == 'F' and not np.isfinite(np.asarray(img)).all():
             issues.append("Contains NaN or Inf values")
 
         if issues:
@@ -66,15 +75,14 @@ def main():
 
     bad_images = []
 
-    # Check images in parallel
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(check_image, img): img for img in images}
+    # Check images in parallel; results arrive in input order
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(check_image, images, chunksize=64)
 
-        for i, future in enumerate(as_completed(futures)):
+        for i, (path, issues) in enumerate(results):
             if (i + 1) % 1000 == 0:
                 print(f"  Checked {i + 1}/{len(images)}...")
 
-            path, issues = future.result()
             if path:
                 bad_images.append((path, issues))
 
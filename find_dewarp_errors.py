@@ -1,13 +1,11 @@
 """
 Find images that cause dewarping errors by actually running the dewarp function.
 """
-import os
 import sys
 import numpy as np
 from pathlib import Path
 from PIL import Image
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Import kraken's dewarping
 try:
@@ -16,26 +14,46 @@ except ImportError:
     print("Error: kraken not installed")
     sys.exit(1)
 
+# Threads used to delete bad images
+IO_WORKERS = 16
+
+# Set per worker process by init_worker
+_normalizer = None
+
+
+def init_worker():
+    """Create the worker's CenterNormalizer once instead of once per image."""
+    global _normalizer
+    _normalizer = CenterNormalizer()
+
 
 def test_dewarp(img_path):
     """Test if an image can be dewarped without errors."""
     try:
-        img = Image.open(img_path).convert('L')  # Convert to grayscale
-        arr = np.array(img)
+        img = Image.open(img_path)
 
-        # Skip very small images
-        if arr.shape[0] < 10 or arr.shape[1] < 10:
+        # Skip very small images (size is known from the header, no decode)
+        if img.height < 10 or img.width < 10:
             return img_path, "Too small"
 
+        # JPEGs can be decoded straight to grayscale by libjpeg
+        if img.format == 'JPEG':
+            img.draft('L', img.size)
+
+        # Read-only view of the decoded pixels, no copy
+        arr = np.asarray(img.convert('L'))  # Convert to grayscale
+        arr_max = arr.max()
+
         # Skip blank images
-        if arr.min() == arr.max():
+        if arr.min() == arr_max:
             return img_path, "Blank image"
 
         # Try the actual dewarp
-        normalizer = CenterNormalizer()
+        if _normalizer is None:
+            init_worker()
         try:
             # This is what kraken does internally
-            normalized = normalizer.normalize(arr, cval=np.amax(arr))
+            normalized = _normalizer.normalize(arr, cval=arr_max)
         except Exception as e:
             return img_path, f"Dewarp error: {str(e)[:100]}"
 
@@ -45,6 +63,18 @@ def test_dewarp(img_path):
         return img_path, f"Error: {str(e)[:100]}"
 
 
+def remove_image(path):
+    """Delete an image and its .gt.txt; returns None or an error message."""
+    try:
+        path.unlink()
+        gt_path = path.with_suffix('.gt.txt')
+        if gt_path.exists():
+            gt_path.unlink()
+        return None
+    except Exception as e:
+        return str(e)
+
+
 def main():
     if len(sys.argv) < 2:
         data_dir = Path("training_data_lines/balanced_training")
@@ -62,14 +92,16 @@ def main():
 
     bad_images = []
 
-    # Test images (use single process to avoid multiprocessing issues with kraken)
-    for i, img_path in enumerate(images):
-        if (i + 1) % 500 == 0:
-            print(f"  Tested {i + 1}/{len(images)}... ({len(bad_images)} errors found)")
+    # Test images in parallel; each worker builds its normalizer once
+    with ProcessPoolExecutor(initializer=init_worker) as executor:
+        results = executor.map(test_dewarp, images, chunksize=64)
+
+        for i, (path, error) in enumerate(results):
+            if (i + 1) % 500 == 0:
+                print(f"  Tested {i + 1}/{len(images)}... ({len(bad_images)} errors found)")
 
-        path, error = test_dewarp(img_path)
-        if path:
-            bad_images.append((path, error))
+            if path:
+                bad_images.append((path, error))
 
     # Report findings
     print(f"\n{'='*60}")
@@ -93,15 +125,13 @@ def main():
         print(f"\n{'='*60}")
         if '--remove' in sys.argv:
             removed = 0
-            for path, _ in bad_images:
-                try:
-                    path.unlink()
-                    gt_path = path.with_suffix('.gt.txt')
-                    if gt_path.exists():
-                        gt_path.unlink()
-                    removed += 1
-                except Exception as e:
-                    print(f"Error removing {path}: {e}")
+            bad_paths = [path for path, _ in bad_images]
+            with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+                for path, error in zip(bad_paths, executor.map(remove_image, bad_paths)):
+                    if error is None:
+                        removed += 1
+                    else:
+                        print(f"Error removing {path}: {error}")
             print(f"Removed {removed} images and their ground truth files.")
         else:
             print(f"To remove these images, run:")
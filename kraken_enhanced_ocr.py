@@ -19,19 +19,49 @@ Usage:
 """
 
 import sys
+from importlib.resources import files
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Any
 from dataclasses import dataclass
 
+import numpy as np
 from PIL import Image
 
 # Kraken imports
 from kraken import blla, rpred
-from kraken.lib import models
+from kraken.lib import models, vgsl
 from kraken.containers import Segmentation
 
 # Import enhanced post-processor
-from post_process_enhanced import EnhancedPostProcessor, MultiHypothesisProcessor
+from post_process_enhanced import EnhancedPostProcessor, MultiHypothesisProcessor, CONFUSION_MATRIX
+
+BASE_DIR = Path(__file__).parent
+
+
+@lru_cache(maxsize=1)
+def _resolve_dict_path() -> Optional[str]:
+    """First default dictionary file that exists; looked up once per process."""
+    possible_dicts = [
+        BASE_DIR / "dictionaries" / "persian_dictionary_ganjoor.txt",
+        BASE_DIR / "dictionaries" / "enhanced_persian_dict.txt",
+        BASE_DIR / "ocr_dictionary.txt",
+    ]
+    for p in possible_dicts:
+        if p.exists():
+            return str(p)
+    return None
+
+
+@lru_cache(maxsize=1)
+def _resolve_ctx_path() -> Optional[str]:
+    """Default context model file if it exists; looked up once per process."""
+    ctx_path = BASE_DIR / "ocr_context_model.pkl"
+    if ctx_path.exists():
+        return str(ctx_path)
+    return None
 
 
 @dataclass
@@ -64,6 +94,11 @@ class OCRResult:
     hypotheses: List[Tuple[str, float]]  # Alternative readings
 
 
+def _empty_result() -> OCRResult:
+    """A fresh empty result for an image that failed in recognize_batch."""
+    return OCRResult(text="", raw_text="", lines=[], corrections=[], hypotheses=[])
+
+
 class EnhancedOCR:
     """
     Enhanced OCR with multi-hypothesis and post-processing.
@@ -85,12 +120,18 @@ class EnhancedOCR:
         """
         self.device = device
         self.model = None
+        self.seg_model = None
         self.post_processor = None
         self.multi_hyp_processor = None
 
         # Load Kraken model
         self._load_model(model_path)
 
+        # Load the segmentation model once; blla.segment would otherwise
+        # load it from disk for every image
+        self.seg_model = vgsl.TorchVGSLModel.load_model(
+            str(files('kraken').joinpath('blla.mlmodel')))
+
         # Load post-processor
         self._load_post_processor(dictionary_path, context_model_path)
 
@@ -108,25 +149,11 @@ class EnhancedOCR:
                               dictionary_path: Optional[str],
                               context_model_path: Optional[str]):
         """Load post-processor with dictionary and context model."""
-        base_dir = Path(__file__).parent
-
-        # Find dictionary
+        # Find dictionary and context model (default locations are cached)
         if dictionary_path is None:
-            possible_dicts = [
-                base_dir / "dictionaries" / "persian_dictionary_ganjoor.txt",
-                base_dir / "dictionaries" / "enhanced_persian_dict.txt",
-                base_dir / "ocr_dictionary.txt",
-            ]
-            for p in possible_dicts:
-                if p.exists():
-                    dictionary_path = str(p)
-                    break
-
-        # Find context model
+            dictionary_path = _resolve_dict_path()
         if context_model_path is None:
-            ctx_path = base_dir / "ocr_context_model.pkl"
-            if ctx_path.exists():
-                context_model_path = str(ctx_path)
+            context_model_path = _resolve_ctx_path()
 
         # Create post-processor
         self.post_processor = EnhancedPostProcessor(
@@ -137,10 +164,22 @@ class EnhancedOCR:
         # Create multi-hypothesis processor
         self.multi_hyp_processor = MultiHypothesisProcessor(self.post_processor)
 
+    def _load_image(self, image_path: str) -> Image.Image:
+        """Open an image file as grayscale."""
+        image = Image.open(image_path)
+        if image.mode != 'L':
+            image = image.convert('L')
+        return image
+
+    def _segment_loaded(self, load_future) -> Tuple[Image.Image, Segmentation]:
+        """Segment an image once its prefetch load is done; run on the segmentation thread."""
+        image = load_future.result()
+        return image, self.segment(image)
+
     def segment(self, image: Image.Image) -> Segmentation:
         """Segment image into text lines."""
         # Use baseline segmentation
-        return blla.segment(image)
+        return blla.segment(image, model=self.seg_model)
 
     def recognize_line(self,
                         image: Image.Image,
@@ -157,10 +196,12 @@ class EnhancedOCR:
             line_text = record.prediction
             line_conf = record.confidences
 
-            avg_conf = sum(line_conf) / len(line_conf) if line_conf else 0.0
+            # One array for the line mean and the per-word means
+            confs = np.asarray(line_conf, dtype=np.float64)
+            avg_conf = float(confs.mean()) if confs.size else 0.0
 
             # Parse into words
-            words = self._parse_words(line_text, line_conf, record.cuts)
+            words = self._parse_words(line_text, confs, record.cuts)
 
             line_info = LineInfo(
                 text=line_text,
@@ -184,33 +225,42 @@ class EnhancedOCR:
         if not word_texts:
             return words
 
-        # Distribute confidences across words
-        char_idx = 0
-        for word_text in word_texts:
-            word_len = len(word_text)
-
-            # Get confidence for this word's characters
-            if char_idx + word_len <= len(confidences):
-                word_conf = confidences[char_idx:char_idx + word_len]
+        # Distribute confidences across words: word i covers characters
+        # [starts[i], ends[i]) of the line (+1 per word for the space)
+        confs = np.asarray(confidences, dtype=np.float64)
+        lens = np.array([len(w) for w in word_texts], dtype=np.int64)
+        starts = np.zeros(len(word_texts), dtype=np.int64)
+        starts[1:] = np.cumsum(lens[:-1] + 1)
+        ends = starts + lens
+
+        # Words past the end of the confidences get 0.5 per character
+        in_range = ends <= confs.size
+        means = np.full(len(word_texts), 0.5)
+        if in_range.any():
+            # One reduction over [start, end) pairs; every other sum is a
+            # word, the rest are the gaps between words
+            bounds = np.column_stack((starts[in_range], ends[in_range])).ravel()
+            sums = np.add.reduceat(np.append(confs, 0.0), bounds)[::2]
+            means[in_range] = sums / lens[in_range]
+
+        for i, word_text in enumerate(word_texts):
+            if in_range[i]:
+                word_conf = confs[starts[i]:ends[i]].tolist()
             else:
-                word_conf = [0.5] * word_len
-
-            avg_conf = sum(word_conf) / len(word_conf) if word_conf else 0.0
+                word_conf = [0.5] * len(word_text)
 
             # Position (approximate from cuts if available)
             position = (0, 0, 0, 0)  # TODO: extract from cuts
 
             word_info = WordInfo(
                 text=word_text,
-                confidence=avg_conf,
-                char_confidences=list(word_conf),
+                confidence=float(means[i]),
+                char_confidences=word_conf,
                 position=position,
                 alternatives=[]
             )
             words.append(word_info)
 
-            char_idx += word_len + 1  # +1 for space
-
         return words
 
     def recognize(self,
@@ -229,9 +279,7 @@ class EnhancedOCR:
             OCRResult with text, confidence, and correction info
         """
         # Load image
-        image = Image.open(image_path)
-        if image.mode != 'L':
-            image = image.convert('L')
+        image = self._load_image(image_path)
 
         if verbose:
             print(f"Processing: {image_path}")
@@ -242,6 +290,14 @@ class EnhancedOCR:
             print("Segmenting...")
         bounds = self.segment(image)
 
+        return self._recognize_segmented(image, bounds, apply_postprocess, verbose)
+
+    def _recognize_segmented(self,
+                             image: Image.Image,
+                             bounds: Segmentation,
+                             apply_postprocess: bool = True,
+                             verbose: bool = False) -> OCRResult:
+        """Recognition and post-processing of an already segmented image."""
         if verbose:
             print(f"Found {len(bounds.lines)} lines")
 
@@ -250,33 +306,37 @@ class EnhancedOCR:
             print("Recognizing...")
         lines = self.recognize_line(image, bounds)
 
+        return self._postprocess(lines, apply_postprocess, verbose)
+
+    def _postprocess(self,
+                     lines: List[LineInfo],
+                     apply_postprocess: bool = True,
+                     verbose: bool = False) -> OCRResult:
+        """Post-process recognized lines and build the OCRResult."""
         # Combine lines into full text
         raw_text = '\n'.join(line.text for line in lines)
 
-        # Collect all words with confidences for post-processing
-        all_words = []
-        all_word_confidences = []
-
-        for line in lines:
-            for word in line.words:
-                all_words.append(word.text)
-                all_word_confidences.append(word.char_confidences)
-
-        # Apply post-processing
+        # Apply post-processing, one call per line: line structure is kept
+        # as is, with no join/split round-trip to restore line breaks
         corrections = []
         if apply_postprocess and self.post_processor:
             if verbose:
                 print("Post-processing...")
 
-            text_to_process = ' '.join(all_words)
-            corrected_text, corrections = self.post_processor.process_with_confidence(
-                text_to_process,
-                all_word_confidences,
-                verbose=verbose
-            )
-
-            # Restore line breaks
-            final_text = self._restore_line_breaks(corrected_text, lines)
+            corrected_lines = []
+            for line in lines:
+                if not line.words:
+                    corrected_lines.append('')
+                    continue
+                line_text, line_corrections = self.post_processor.process_with_confidence(
+                    ' '.join(word.text for word in line.words),
+                    [word.char_confidences for word in line.words],
+                    verbose=verbose
+                )
+                corrected_lines.append(line_text)
+                corrections.extend(line_corrections)
+
+            final_text = '\n'.join(corrected_lines)
         else:
             final_text = raw_text
 
@@ -292,65 +352,84 @@ class EnhancedOCR:
         if verbose:
             print(f"\nRecognition complete:")
             print(f"  Lines: {len(lines)}")
-            print(f"  Words: {len(all_words)}")
+            print(f"  Words: {sum(len(line.words) for line in lines)}")
             print(f"  Corrections: {len(corrections)}")
 
         return result
 
-    def _restore_line_breaks(self, text: str, lines: List[LineInfo]) -> str:
-        """Restore line breaks to match original structure."""
-        words = text.split()
-        result_lines = []
-
-        word_idx = 0
-        for line in lines:
-            line_word_count = len(line.words)
-            line_words = words[word_idx:word_idx + line_word_count]
-            result_lines.append(' '.join(line_words))
-            word_idx += line_word_count
-
-        # Add any remaining words to last line
-        if word_idx < len(words):
-            if result_lines:
-                result_lines[-1] += ' ' + ' '.join(words[word_idx:])
-            else:
-                result_lines.append(' '.join(words[word_idx:]))
-
-        return '\n'.join(result_lines)
-
     def recognize_batch(self,
                          image_paths: List[str],
                          apply_postprocess: bool = True,
-                         verbose: bool = False) -> List[OCRResult]:
+                         verbose: bool = False,
+                         prefetch_workers: int = 4) -> List[OCRResult]:
         """
         Process multiple images.
 
+        The next images are decoded on background threads and segmented
+        on one more thread (PIL decode and torch release the GIL) while the
+        current image is recognized, so their latency is hidden behind
+        recognition. Segmentation stays on a single thread, so the shared
+        segmentation model is never run concurrently and only one torch
+        call competes with recognition for the cores.
+        Post-processing of each recognized image runs on one more thread,
+        overlapping with recognition of the next image. With verbose, the
+        output of the two stages can interleave.
+
         Args:
             image_paths: List of image file paths
             apply_postprocess: Whether to apply post-processing
             verbose: Print progress
+            prefetch_workers: Images decoded ahead in parallel
 
         Returns:
-            List of OCRResult objects
+            List of OCRResult objects, in input order
         """
-        results = []
-
-        for i, path in enumerate(image_paths):
-            if verbose:
-                print(f"\n[{i+1}/{len(image_paths)}] ", end="")
-
-            try:
-                result = self.recognize(path, apply_postprocess, verbose)
-                results.append(result)
-            except Exception as e:
-                print(f"Error processing {path}: {e}")
-                results.append(OCRResult(
-                    text="",
-                    raw_text="",
-                    lines=[],
-                    corrections=[],
-                    hypotheses=[]
-                ))
+        # (path, future) per image; the future gives its OCRResult
+        submitted = []
+
+        with ThreadPoolExecutor(max_workers=prefetch_workers) as pool, \
+                ThreadPoolExecutor(max_workers=1) as seg_pool, \
+                ThreadPoolExecutor(max_workers=1) as post_pool:
+            # Only a few images are in flight at a time, so memory stays bounded
+            pending = deque()
+            next_idx = 0
+
+            for i, path in enumerate(image_paths):
+                while next_idx < len(image_paths) and len(pending) < 2 * prefetch_workers:
+                    load = pool.submit(self._load_image, image_paths[next_idx])
+                    pending.append(seg_pool.submit(self._segment_loaded, load))
+                    next_idx += 1
+                future = pending.popleft()
+
+                if verbose:
+                    print(f"\n[{i+1}/{len(image_paths)}] ", end="")
+                    print(f"Processing: {path}")
+
+                try:
+                    image, bounds = future.result()
+                    if verbose:
+                        print(f"Found {len(bounds.lines)} lines")
+                        print("Recognizing...")
+                    lines = self.recognize_line(image, bounds)
+                except Exception as e:
+                    print(f"Error processing {path}: {e}")
+                    submitted.append((path, None))
+                    continue
+
+                submitted.append((path, post_pool.submit(
+                    self._postprocess, lines, apply_postprocess, verbose)))
+
+            # Collect in input order
+            results = []
+            for path, future in submitted:
+                if future is None:
+                    results.append(_empty_result())
+                    continue
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"Error processing {path}: {e}")
+                    results.append(_empty_result())
 
         return results
 
@@ -374,8 +453,6 @@ def get_word_alternatives(word: str,
     Returns:
         List of (alternative_word, score) tuples
     """
-    from post_process_enhanced import CONFUSION_MATRIX
-
     alternatives = [(word, 100.0)]
 
     # Find low-confidence positions
@@ -392,8 +469,11 @@ def get_word_alternatives(word: str,
         char = word[pos]
 
         if char in CONFUSION_MATRIX:
+            # Text around the position, sliced once for all replacements
+            prefix = word[:pos]
+            suffix = word[pos+1:]
             for replacement in CONFUSION_MATRIX[char][:3]:  # Top 3 confusions
-                alt_word = word[:pos] + replacement + word[pos+1:]
+                alt_word = prefix + replacement + suffix
 
                 # Score based on confidence boost for fixing low-conf char
                 # and whether result is in dictionary
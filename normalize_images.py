@@ -2,55 +2,87 @@
 Normalize all training images to grayscale (mode L) for consistent training.
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image
 from collections import Counter
 
+from page_common import PNG_COMPRESS_LEVEL
+
 BASE_DIR = Path(__file__).parent
 BALANCED_DIR = BASE_DIR / "training_data_lines" / "balanced_training"
 
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PIL mode for each PNG IHDR color type (8-bit samples)
+PNG_COLOR_TYPE_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+def png_mode(path):
+    """
+    PIL mode of a PNG, read from its IHDR chunk (first 26 bytes) only.
+
+    Returns 'ERROR' if the file cannot be read or is not a PNG.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(26)
+    except OSError:
+        return 'ERROR'
+    if len(header) < 26 or not header.startswith(PNG_SIGNATURE) or header[12:16] != b'IHDR':
+        return 'ERROR'
+
+    bit_depth, color_type = header[24], header[25]
+    if color_type == 0 and bit_depth == 1:
+        return '1'
+    if color_type == 0 and bit_depth == 16:
+        return 'I;16'
+    return PNG_COLOR_TYPE_MODES.get(color_type, 'ERROR')
+
+def convert_to_gray(img_path):
+    """Convert one image to grayscale in place; returns None or an error message."""
+    try:
+        img = Image.open(img_path)
+        if img.mode != 'L':
+            img.convert('L').save(img_path, compress_level=PNG_COMPRESS_LEVEL)
+        return None
+    except Exception as e:
+        return str(e)
+
 def main():
-    png_files = list(BALANCED_DIR.glob("*.png"))
+    with os.scandir(BALANCED_DIR) as it:
+        png_files = [Path(entry.path) for entry in it if entry.name.endswith('.png')]
     print(f"Found {len(png_files)} images in balanced_training\n")
 
-    # First, analyze current modes
+    # First, analyze current modes (PNG headers only, nothing is decoded)
     print("Analyzing image modes...")
-    modes = Counter()
-    for img_path in png_files:
-        try:
-            img = Image.open(img_path)
-            modes[img.mode] += 1
-        except:
-            modes['ERROR'] += 1
+    file_modes = [png_mode(img_path) for img_path in png_files]
+    modes = Counter(file_modes)
 
     print("Current image modes:")
     for mode, count in modes.most_common():
         print(f"  {mode}: {count}")
 
-    # Convert all to grayscale
+    # Convert all to grayscale; files already in mode L are not reopened
     print(f"\nConverting all images to grayscale (L)...")
+    to_convert = [p for p, mode in zip(png_files, file_modes) if mode != 'L']
     converted = 0
-    already_L = 0
+    already_L = len(png_files) - len(to_convert)
     errors = 0
 
-    for i, img_path in enumerate(png_files):
-        try:
-            img = Image.open(img_path)
+    # Decode + PNG encode is CPU bound, so files are converted in parallel
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(convert_to_gray, to_convert, chunksize=32)
 
-            if img.mode != 'L':
-                # Convert to grayscale
-                img_gray = img.convert('L')
-                img_gray.save(img_path)
+        for i, (img_path, error) in enumerate(zip(to_convert, results)):
+            if error is None:
                 converted += 1
             else:
-                already_L += 1
+                print(f"  Error with {img_path.name}: {error}")
+                errors += 1
 
             if (i + 1) % 2000 == 0:
-                print(f"  Processed {i + 1}/{len(png_files)}...")
-
-        except Exception as e:
-            print(f"  Error with {img_path.name}: {e}")
-            errors += 1
+                print(f"  Processed {i + 1}/{len(to_convert)}...")
 
     print(f"\n{'='*50}")
     print(f"Done!")
@@ -10,16 +10,33 @@ Examples:
     python ocr_image.py my_image.jpg --model models/fine_tuned_17.mlmodel
 """
 
-import subprocess
 import os
 import sys
 import argparse
 from pathlib import Path
+from PIL import Image
+
+# Kraken runs in this process, so run the script with the venv's Python
+try:
+    from kraken import binarization, blla, rpred
+    from kraken.lib import models
+    HAS_KRAKEN = True
+except ImportError:
+    HAS_KRAKEN = False
 
 
 # Default settings
 DEFAULT_MODEL = "models/fine_tuned_best.mlmodel"
-KRAKEN_PATH = r".venv\Scripts\kraken.exe"
+
+# Loaded recognition models by path, so repeated calls skip the model load
+_MODEL_CACHE = {}
+
+
+def load_model(model_path):
+    """Load a Kraken recognition model once per path and keep it resident."""
+    if model_path not in _MODEL_CACHE:
+        _MODEL_CACHE[model_path] = models.load_any(model_path, device='cpu')
+    return _MODEL_CACHE[model_path]
 
 
 def ocr_image(image_path, output_path=None, model_path=DEFAULT_MODEL, direction="horizontal-rl", padding=20):
@@ -31,13 +48,19 @@ def ocr_image(image_path, output_path=None, model_path=DEFAULT_MODEL, direction=
         output_path: Path where the text output will be saved (optional)
         model_path: Path to the trained model
         direction: Text direction ('horizontal-rl' for right-to-left, 'horizontal-lr' for left-to-right)
-        padding: Padding around detected lines
+        padding: Padding around detected lines (only used by Kraken's legacy
+            box segmenter; the baseline segmenter ignores it, as the CLI did)
 
     Returns:
         str: The extracted text, or None if OCR failed
     """
     image_path = str(image_path)
 
+    if not HAS_KRAKEN:
+        print("Error: kraken is not installed in this Python environment")
+        print("Make sure you have activated the virtual environment.")
+        return None
+
     # Check if image exists
     if not os.path.exists(image_path):
         print(f"Error: Image file not found: {image_path}")
@@ -60,57 +83,28 @@ def ocr_image(image_path, output_path=None, model_path=DEFAULT_MODEL, direction=
 
     output_path = str(output_path)
 
-    # Build kraken command
-    cmd = [
-        KRAKEN_PATH,
-        "-i", image_path, output_path,
-        "binarize",
-        "segment", "-d", direction, "-p", str(padding), str(padding),
-        "ocr", "-m", model_path
-    ]
-
     print(f"Processing: {image_path}")
     print(f"Model: {model_path}")
     print(f"Output: {output_path}")
     print("-" * 50)
 
-    # Set environment for UTF-8
-    env = os.environ.copy()
-    env['PYTHONIOENCODING'] = 'utf-8'
-    env['PYTHONUTF8'] = '1'
-
-    # Run kraken
+    # Same pipeline as `kraken binarize segment ocr`, without a new process
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            env=env
-        )
-
-        if result.returncode != 0:
-            print(f"Kraken error (exit code {result.returncode}):")
-            if result.stderr:
-                print(result.stderr)
-            return None
-
-        # Read and return the output
-        if os.path.exists(output_path):
-            with open(output_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            print("OCR completed successfully!")
-            print("-" * 50)
-            return text
-        else:
-            print("Error: Output file was not created")
-            return None
-
-    except FileNotFoundError:
-        print(f"Error: Kraken executable not found at {KRAKEN_PATH}")
-        print("Make sure you have activated the virtual environment.")
-        return None
+        model = load_model(model_path)
+
+        img = Image.open(image_path)
+        img_bin = binarization.nlbin(img)
+        seg = blla.segment(img_bin, text_direction=direction)
+        preds = rpred.rpred(model, img_bin, seg)
+        text = '\n'.join(record.prediction for record in preds)
+
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        print("OCR completed successfully!")
+        print("-" * 50)
+        return text
+
     except Exception as e:
         print(f"Error running OCR: {e}")
         return None
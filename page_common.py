@@ -0,0 +1,186 @@
+"""
+Shared PAGE XML parsing and output helpers for the line extractors.
+
+The RASAM scripts (extract_rasam_lines*.py, download_rasam.py) and the BL
+and VML-AHTE extractors parse PAGE XML with parse_page_xml. The RASM
+extractor only takes write_gt and PNG_COMPRESS_LEVEL, the Arshasb and
+normalize scripts only PNG_COMPRESS_LEVEL.
+BASE_DIR, REPO_DIR and IMAGES_DIR are the RASAM data locations.
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from lxml import etree
+
+BASE_DIR = Path(__file__).parent
+REPO_DIR = BASE_DIR / "training_data_lines" / "rasam_repo"
+IMAGES_DIR = BASE_DIR / "training_data_lines" / "rasam_images"
+PNG_COMPRESS_LEVEL = 1  # Fast zlib setting; PNG encode dominates extraction time
+
+# Flags for write_gt; O_BINARY keeps Windows from translating newlines
+GT_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+
+def find_page_xml(repo_dir):
+    """Sorted paths of the PAGE XML files under repo_dir/page, from one os.walk."""
+    xml_files = []
+    for dirpath, _, filenames in os.walk(repo_dir / "page"):
+        xml_files.extend(Path(dirpath) / name for name in filenames if name.endswith('.xml'))
+    xml_files.sort()
+    return xml_files
+
+
+def downloaded_image_stems(images_dir):
+    """Stems of the downloaded .jpg page images, from one directory listing."""
+    try:
+        with os.scandir(images_dir) as it:
+            return {entry.name[:-4] for entry in it if entry.name.endswith('.jpg')}
+    except FileNotFoundError:
+        return set()
+
+
+@lru_cache(maxsize=None)
+def page_xpaths(ns_uri):
+    """
+    Compiled (Coords, Unicode) XPaths relative to a PAGE TextLine.
+
+    Compiled once per namespace instead of re-parsing the path strings for
+    every line; ns_uri=None gives namespace-free paths.
+    """
+    if ns_uri is None:
+        return (
+            etree.XPath('Coords'),
+            etree.XPath('TextEquiv/Unicode'),
+        )
+    ns = {'page': ns_uri}
+    return (
+        etree.XPath('page:Coords', namespaces=ns),
+        etree.XPath('page:TextEquiv/page:Unicode', namespaces=ns),
+    )
+
+
+def parse_points(coords_str):
+    """Parse a PAGE 'x,y x,y ...' points string to an (N, 2) float array, or None."""
+    # One conversion per string; a malformed value raises (on any numpy
+    # version) for the whole line
+    try:
+        points = np.array(coords_str.replace(',', ' ').split(), dtype=np.float64)
+    except ValueError:
+        return None
+    if points.size < 2 or points.size % 2:
+        return None
+    return points.reshape(-1, 2)
+
+
+def points_bbox(points):
+    """Integer bounding box (x1, y1, x2, y2) of an (N, 2) points array."""
+    x1, y1 = points.min(axis=0)
+    x2, y2 = points.max(axis=0)
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+def line_boxes(lines, width, height, padding, min_width, min_height):
+    """
+    Padded crop boxes for all lines of a page, computed as one array.
+
+    Returns (boxes, keep): boxes is an (N, 4) int array of [x1, y1, x2, y2]
+    clamped to the image, keep marks boxes of at least min_width x min_height.
+    """
+    boxes = np.array([points_bbox(line['points']) for line in lines], dtype=np.int64)
+    boxes = boxes.reshape(-1, 4)
+    boxes[:, :2] -= padding
+    boxes[:, 2:] += padding
+    np.clip(boxes[:, 0::2], 0, width, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, height, out=boxes[:, 1::2])
+
+    keep = ((boxes[:, 2] - boxes[:, 0] >= min_width) &
+            (boxes[:, 3] - boxes[:, 1] >= min_height))
+    return boxes, keep
+
+
+def read_textline(textline, find_coords, find_unicode):
+    """Return {'points', 'text', 'id'} for a PAGE TextLine element, or None."""
+    coords = find_coords(textline)
+    if not coords:
+        return None
+
+    coords_str = coords[0].get('points', '')
+    if not coords_str:
+        return None
+
+    # Get text
+    text_elems = find_unicode(textline)
+    if not text_elems or text_elems[0].text is None:
+        return None
+
+    text = text_elems[0].text.strip()
+    if not text:
+        return None
+
+    # Parse polygon coordinates
+    points = parse_points(coords_str)
+    if points is None:
+        return None
+    return {'points': points, 'text': text, 'id': textline.get('id', '')}
+
+
+def parse_page_xml(xml_path, read_line=read_textline, xpaths=page_xpaths):
+    """
+    Parse PAGE XML; returns (lines, ref_width, ref_height).
+
+    xml_path may also be a binary file object. Each TextLine is passed to
+    read_line(textline, *xpaths(namespace)) and kept unless it returns None;
+    by default lines is a list of {'points', 'text', 'id'}. ref_width and
+    ref_height are the Page imageWidth/imageHeight the coordinates refer to
+    (None if absent).
+    """
+    lines = []
+    ref_width = None
+    ref_height = None
+
+    source = xml_path if hasattr(xml_path, 'read') else str(xml_path)
+    try:
+        # One streaming pass over TextLine end tags (any PAGE version); each
+        # line is freed once read, so memory stays bounded by one line subtree
+        context = etree.iterparse(source, events=('end',), tag='{*}TextLine')
+        line_xpaths = None
+
+        for _, textline in context:
+            if line_xpaths is None:
+                # PAGE version is taken from the element's namespace, no probing
+                line_xpaths = xpaths(etree.QName(textline).namespace)
+
+                # The enclosing Page element carries the reference dimensions
+                page_elem = next(textline.iterancestors('{*}Page'), None)
+                if page_elem is not None:
+                    ref_width = page_elem.get('imageWidth')
+                    ref_height = page_elem.get('imageHeight')
+                    if ref_width:
+                        ref_width = int(ref_width)
+                    if ref_height:
+                        ref_height = int(ref_height)
+
+            entry = read_line(textline, *line_xpaths)
+            if entry:
+                lines.append(entry)
+
+            # Free the processed line and the siblings before it
+            textline.clear(keep_tail=True)
+            while textline.getprevious() is not None:
+                del textline.getparent()[0]
+
+    except Exception as e:
+        print(f"    XML parse error: {e}")
+
+    return lines, ref_width, ref_height
+
+
+def write_gt(path, text):
+    """Write a .gt.txt transcription with one os.write, no file object."""
+    fd = os.open(path, GT_OPEN_FLAGS, 0o644)
+    try:
+        os.write(fd, text.encode('utf-8'))
+    finally:
+        os.close(fd)
@@ -10,11 +10,14 @@ The position of a word in the sentence affects correction:
 - Prefers candidates that commonly appear together with neighbors
 """
 
+import gzip
 import re
 import sys
+from functools import lru_cache
 from pathlib import Path
 from collections import Counter, defaultdict
 import pickle
+import numpy as np
 
 # Try to import fuzzy matching library
 try:
@@ -29,6 +32,19 @@ except ImportError:
         print("WARNING: No fuzzy matching library found.")
         print("Install with: pip install rapidfuzz")
 
+# Cap on the cells in one query-by-dictionary score block; scores are uint8,
+# so this is also its size in bytes (64 MiB)
+CDIST_MAX_CELLS = 64 * 1024 * 1024
+
+# Edge punctuation; Persian characters are kept
+EDGE_PUNCT_RE = re.compile(r'^[^\w\u0600-\u06FF]+|[^\w\u0600-\u06FF]+$')
+
+
+@lru_cache(maxsize=131072)
+def strip_edge_punct(word):
+    """Remove edge punctuation; cached, as the same words recur in scoring."""
+    return EDGE_PUNCT_RE.sub('', word)
+
 
 class ContextAwarePostProcessor:
     def __init__(self, dictionary_path=None, min_word_length=2,
@@ -49,6 +65,7 @@ class ContextAwarePostProcessor:
         self.max_candidates = max_candidates
 
         self.dictionary = set()
+        self._dict_list = None  # Fixed-order copy of dictionary for cdist
         self.word_freq = Counter()
         self.bigrams = defaultdict(Counter)  # bigrams[word1][word2] = count
         self.trigrams = defaultdict(Counter)  # trigrams["w1|w2"][w3] = count
@@ -65,12 +82,16 @@ class ContextAwarePostProcessor:
             print(f"Dictionary not found: {path}")
             return
 
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt', encoding='utf-8', errors='ignore') as f:
             for line in f:
                 word = line.strip()
                 if word and len(word) >= self.min_word_length:
                     self.dictionary.add(word)
 
+        # Same iteration order as the set, built once for batch matching
+        self._dict_list = tuple(self.dictionary)
+
         print(f"Loaded {len(self.dictionary):,} words from dictionary")
 
     def build_context_from_corpus(self, corpus_path=None, text_files=None):
@@ -128,8 +149,9 @@ class ContextAwarePostProcessor:
 
     def _normalize(self, word):
         """Normalize word for matching."""
-        # Remove edge punctuation but keep Persian characters
-        word = re.sub(r'^[^\w\u0600-\u06FF]+|[^\w\u0600-\u06FF]+$', '', word)
+        # Remove edge punctuation but keep Persian characters; the length
+        # check stays per instance since min_word_length is configurable
+        word = strip_edge_punct(word)
         return word if len(word) >= self.min_word_length else None
 
     def get_bigram_score(self, prev_word, word, next_word, prev_prev_word=None):
@@ -210,7 +232,51 @@ class ContextAwarePostProcessor:
 
         return candidates if candidates else [(word, 0)]
 
-    def correct_word_with_context(self, word, prev_word, next_word, prev_prev_word=None):
+    def get_candidates_batch(self, words):
+        """
+        Fuzzy match candidates for many words at once.
+
+        Returns {word: candidates} for the words get_candidates would fuzzy
+        match (long enough, not in the dictionary), with the same results.
+        All of them are scored against the dictionary with rapidfuzz's
+        cdist in blocks, using every core. Other fuzzy libraries, and a
+        threshold of 0, fall back to get_candidates per word.
+        """
+        queries = [w for w in dict.fromkeys(words)
+                   if len(w) >= self.min_word_length and w not in self.dictionary]
+        if not queries or not FUZZY_LIB or not self.dictionary:
+            return {}
+
+        if FUZZY_LIB != "rapidfuzz" or self.fuzzy_threshold <= 0:
+            return {w: self.get_candidates(w) for w in queries}
+
+        if self._dict_list is None or len(self._dict_list) != len(self.dictionary):
+            self._dict_list = tuple(self.dictionary)
+        choices = self._dict_list
+
+        results = {}
+        block = max(1, CDIST_MAX_CELLS // len(choices))
+        for start in range(0, len(queries), block):
+            block_queries = queries[start:start + block]
+            scores = process.cdist(block_queries, choices, scorer=fuzz.ratio,
+                                   score_cutoff=self.fuzzy_threshold,
+                                   dtype=np.uint8, workers=-1)
+
+            for word, row in zip(block_queries, scores):
+                # Only used as a mask: scores under the cutoff come back as 0
+                idx = np.flatnonzero(row)
+                # Exact scores for the few matches; best first, ties in
+                # dictionary order like process.extract
+                matches = sorted(((fuzz.ratio(word, choices[i]), i) for i in idx),
+                                 key=lambda m: -m[0])
+                candidates = [(choices[i], score) for score, i in matches[:self.max_candidates]
+                              if score >= self.fuzzy_threshold]
+                results[word] = candidates if candidates else [(word, 0)]
+
+        return results
+
+    def correct_word_with_context(self, word, prev_word, next_word, prev_prev_word=None,
+                                  candidates=None):
         """
         Correct a word using both fuzzy matching and context.
 
@@ -219,6 +285,7 @@ class ContextAwarePostProcessor:
             prev_word: Previous word in sentence (or None)
             next_word: Next word in sentence (or None)
             prev_prev_word: Word before prev_word for trigram context (or None)
+            candidates: Precomputed get_candidates(word) result (optional)
 
         Returns:
             (corrected_word, was_corrected, debug_info)
@@ -230,7 +297,8 @@ class ContextAwarePostProcessor:
         if word in self.dictionary:
             return word, False, None
 
-        candidates = self.get_candidates(word)
+        if candidates is None:
+            candidates = self.get_candidates(word)
 
         if not candidates or candidates[0][1] == 0:
             return word, False, None
@@ -274,13 +342,17 @@ class ContextAwarePostProcessor:
         corrected_words = []
         corrections = []
 
+        # Fuzzy match all unknown words in one batch up front
+        word_candidates = self.get_candidates_batch(words)
+
         for i, word in enumerate(words):
             prev_prev_word = words[i - 2] if i > 1 else None
             prev_word = words[i - 1] if i > 0 else None
             next_word = words[i + 1] if i < len(words) - 1 else None
 
             corrected, was_corrected, info = self.correct_word_with_context(
-                word, prev_word, next_word, prev_prev_word
+                word, prev_word, next_word, prev_prev_word,
+                candidates=word_candidates.get(word)
             )
 
             corrected_words.append(corrected)
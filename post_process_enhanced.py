@@ -13,6 +13,7 @@ Usage:
     corrected = processor.process_text(text)
 """
 
+import gzip
 import re
 import sys
 from pathlib import Path
@@ -220,7 +221,8 @@ class EnhancedPostProcessor:
             print(f"Dictionary not found: {path}")
             return
 
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt', encoding='utf-8', errors='ignore') as f:
             for line in f:
                 word = line.strip()
                 if word and len(word) >= self.min_word_length:
@@ -31,12 +31,11 @@ def parse_alto_xml(xml_path):
         tree = ET.parse(xml_path)
         root = tree.getroot()
 
-        # Handle namespace
-        for elem in root.iter():
-            if '}' in elem.tag:
-                elem.tag = elem.tag.split('}')[1]
+        # Handle namespace (taken from the root tag, no per-element rewrite)
+        prefix = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+        string_tag = prefix + 'String'
 
-        for textline in root.findall('.//TextLine'):
+        for textline in root.iter(prefix + 'TextLine'):
             hpos = textline.get('HPOS')
             vpos = textline.get('VPOS')
             width = textline.get('WIDTH')
@@ -47,7 +46,7 @@ def parse_alto_xml(xml_path):
 
             # Get text content
             text_parts = []
-            for string in textline.findall('.//String'):
+            for string in textline.iter(string_tag):
                 content = string.get('CONTENT', '')
                 if content:
                     text_parts.append(content)